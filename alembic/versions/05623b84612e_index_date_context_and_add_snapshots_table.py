@@ -0,0 +1,57 @@
+"""index_date_context_and_add_snapshots_table
+
+Revision ID: 05623b84612e
+Revises: 07e9a9fa8511
+Create Date: 2025-04-02 10:42:17.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '05623b84612e'
+down_revision = '07e9a9fa8511'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'hdb_training_features',
+        'date_context',
+        existing_type=sa.String(50),
+        type_=sa.Date,
+        postgresql_using='date_context::date',
+    )
+    op.create_index(
+        'ix_hdb_training_features_date_context',
+        'hdb_training_features',
+        ['date_context'],
+    )
+
+    op.create_table(
+        'hdb_training_features_snapshots',
+        sa.Column('date_context', sa.Date, primary_key=True),
+        sa.Column('number_of_rows', sa.BigInteger, nullable=False),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime, server_default=sa.func.now(), nullable=False),
+    )
+    op.execute("""
+        INSERT INTO hdb_training_features_snapshots (date_context, number_of_rows)
+        SELECT date_context, COUNT(*) FROM hdb_training_features
+        WHERE date_context IS NOT NULL
+        GROUP BY date_context
+    """)
+
+def downgrade() -> None:
+    op.drop_table('hdb_training_features_snapshots')
+    op.drop_index('ix_hdb_training_features_date_context', 'hdb_training_features')
+    op.alter_column(
+        'hdb_training_features',
+        'date_context',
+        existing_type=sa.Date,
+        type_=sa.String(50),
+        postgresql_using='date_context::text',
+    )
@@ -1,15 +1,21 @@
 from bs4 import BeautifulSoup
 import requests
 import pandas as pd
-import json
-from tqdm import tqdm_pandas, tqdm
+import os
 import re
+import sys
 import logging
 
-tqdm_pandas(tqdm())
+sys.path.append("src")
+import hdb_resale_estimator as hdb_est
 
 logger = logging.getLogger(__name__)
 
+# The search url can be pointed to a local stand-in server for testing
+onemap_client = hdb_est.geocoding.OneMapClient(
+    base_url=os.environ.get("ONEMAP_SEARCH_URL", hdb_est.geocoding.ONEMAP_SEARCH_URL)
+)
+
 def find_coordinates(amenities_df: pd.DataFrame) -> pd.DataFrame:
     """Given the names, get the coordinates of all amenities in a dataframe
 
@@ -17,34 +23,10 @@ def find_coordinates(amenities_df: pd.DataFrame) -> pd.DataFrame:
         amenities_df (pd.DataFrame): dataframe containing the names of the amenities
 
     Returns:
-        pd.DataFrame: dataframe containing
+        pd.DataFrame: dataframe containing the first search result of each amenity found
     """
-
-    # Do not need to change the URL
-    url = (
-        "https://developers.onemap.sg/commonapi/search?returnGeom=Y&getAddrDetails=Y&pageNum=1&searchVal="
-    )
-
-    output_df = pd.DataFrame()
-    found = 0
-    for add in tqdm(list(amenities_df["Name"])):
-        add_url = (url+ add)
-        # Retrieve information from website
-        response = requests.get(add_url)
-        try:
-            data = json.loads(response.text)
-        except ValueError:
-            print("JSONDecodeError")
-            pass
-
-        if len(data["results"]) != 0:
-            result = pd.DataFrame([data["results"][0]])
-            result["address"] = add
-
-            output_df = pd.concat([output_df,result])
-            found += 1
-
-    print(f"Found coordinates for {found} out of {len(amenities_df)} amenities")
+    output_df = onemap_client.search_many(amenities_df["Name"])
+    print(f"Found coordinates for {len(output_df)} out of {len(amenities_df)} amenities")
 
     return output_df
 
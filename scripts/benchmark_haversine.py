@@ -0,0 +1,60 @@
+"""Benchmarks the throughput (flats/s) and peak memory of utils.blocked_haversine_nearest
+against the chunk size, on randomly generated flats and amenities around Singapore.
+
+Usage:
+    python scripts/benchmark_haversine.py --flats 200000 --amenities 400
+"""
+import argparse
+import numpy as np
+import sys
+import time
+import tracemalloc
+
+sys.path.append("src")
+import hdb_resale_estimator as hdb_est
+
+
+def generate_coordinates(size: int, rng: np.random.Generator) -> np.ndarray:
+    """Generates random coordinates within the bounding box of Singapore"""
+    return np.column_stack(
+        [rng.uniform(1.25, 1.45, size), rng.uniform(103.65, 104.0, size)]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flats", type=int, default=200000)
+    parser.add_argument("--amenities", type=int, default=400)
+    parser.add_argument(
+        "--chunk-sizes", type=int, nargs="+", default=[256, 1024, 4096, 16384, 65536]
+    )
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float64"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    flat_coordinates = generate_coordinates(args.flats, rng)
+    amenity_coordinates = generate_coordinates(args.amenities, rng)
+
+    print(f"{'dtype':>8} {'chunk_size':>10} {'flats/s':>12} {'peak MiB':>9}")
+    for dtype in args.dtypes:
+        for chunk_size in args.chunk_sizes:
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            hdb_est.utils.blocked_haversine_nearest(
+                flat_coordinates,
+                amenity_coordinates,
+                radii=[1, 2],
+                k_nearest=1,
+                chunk_size=chunk_size,
+                dtype=dtype,
+            )
+            elapsed = time.perf_counter() - start_time
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"{dtype:>8} {chunk_size:>10} {args.flats / elapsed:>12,.0f} {peak_memory / 2**20:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Checks that Builder.predict_inference_dict matches the pandas inference path
+(process_inference_data and make_predictions) exactly, and benchmarks the preprocessing time
+of a single inference row with both paths, on builders trained on randomly generated
+derived hdb features. Exits with an error if the predictions of any model differ.
+
+Usage:
+    python scripts/benchmark_inference.py --models xgboost randforest --rows 500
+"""
+import argparse
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+sys.path.append("src")
+import hdb_resale_estimator as hdb_est
+
+MODEL_PARAMS = {
+    "xgboost": {"n_estimators": 50, "max_depth": 6, "random_state": 42},
+    "randforest": {"n_estimators": 20, "max_depth": 10, "random_state": 42},
+    "ebm": {"random_state": 42, "interactions": 0, "outer_bags": 1},
+}
+
+
+def generate_derived_features(size: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Generates random derived hdb features with the columns used for training"""
+    data = pd.DataFrame(
+        {
+            "month": rng.integers(1, 13, size).astype(str),
+            "year": rng.integers(2017, 2024, size),
+            "flat_type": rng.choice(["3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE"], size),
+            "storey_range": rng.choice(["01 TO 03", "04 TO 06", "07 TO 09"], size),
+            "floor_area_sqm": rng.uniform(40, 150, size).round(),
+            "flat_model": rng.choice(["STANDARD", "MODEL A", "APARTMENT", "SPECIAL"], size),
+            "lease_age": rng.integers(0, 55, size),
+            "region": rng.choice(["Central", "East", "North", "North-East", "West"], size),
+        }
+    )
+    for amenity in ["malls", "schools", "parks", "MRT_stations"]:
+        data[f"no_of_{amenity}_within_2_km"] = rng.integers(0, 15, size)
+        data[f"distance_to_nearest_{amenity}"] = rng.uniform(0, 5, size)
+    data["resale_price"] = (
+        2000 * data["floor_area_sqm"] - 3000 * data["lease_age"] + rng.normal(0, 2e4, size)
+    )
+
+    return data
+
+
+def train_builder(
+    model_name: str, data: pd.DataFrame, sparse_one_hot: bool, scale_data: bool
+):
+    """Processes the features and fits a model the same way as training.train_pipeline"""
+    features = data.drop(columns="resale_price")
+    builder = hdb_est.modeling.builder.ClassicalModelBuilder().set_model(
+        model_name, MODEL_PARAMS[model_name]
+    )
+    builder.objects["features"] = list(features.columns)
+    features = builder._ordinal_encode_variables(features, columns=["storey_range"])
+    features = builder._one_hot_encode_cat_var(features, sparse_output=sparse_one_hot)
+    if scale_data:
+        features = builder.scale_data(features.sort_index(axis=1))
+    builder.model.fit(builder.model_input(features), data["resale_price"])
+
+    return builder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=["xgboost", "randforest"])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--train-rows", type=int, default=20000)
+    parser.add_argument("--sparse-one-hot", action="store_true")
+    parser.add_argument("--scale-data", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    data = generate_derived_features(args.train_rows, rng)
+    rows = generate_derived_features(args.rows, rng).drop(columns="resale_price")
+    feature_dicts = rows.to_dict(orient="records")
+
+    print(f"{'model':>10} {'max abs diff':>13} {'pandas us/row':>14} {'compiled us/row':>16}")
+    mismatched_models = []
+    for model_name in args.models:
+        builder = train_builder(model_name, data, args.sparse_one_hot, args.scale_data)
+        features = builder.objects["features"]
+
+        pandas_predictions, compiled_predictions = [], []
+        for feature_dict in feature_dicts:
+            processed = builder.process_inference_data(pd.DataFrame([feature_dict])[features])
+            pandas_predictions.append(
+                hdb_est.modeling.model.make_predictions(builder, processed)[0]
+            )
+            compiled_predictions.append(builder.predict_inference_dict(feature_dict))
+        max_abs_diff = np.abs(
+            np.array(pandas_predictions) - np.array(compiled_predictions)
+        ).max()
+        if not np.array_equal(pandas_predictions, compiled_predictions):
+            mismatched_models.append(model_name)
+
+        start_time = time.perf_counter()
+        for feature_dict in feature_dicts:
+            builder.process_inference_data(pd.DataFrame([feature_dict])[features])
+        pandas_time = (time.perf_counter() - start_time) / len(feature_dicts)
+
+        start_time = time.perf_counter()
+        for feature_dict in feature_dicts:
+            builder.process_inference_dict(feature_dict)
+        compiled_time = (time.perf_counter() - start_time) / len(feature_dicts)
+
+        print(
+            f"{model_name:>10} {max_abs_diff:>13.6g} {pandas_time * 1e6:>14,.0f} {compiled_time * 1e6:>16,.1f}"
+        )
+
+    if mismatched_models:
+        sys.exit(
+            f"Compiled predictions differ from the pandas predictions for {mismatched_models}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmarks the throughput (rows/s) of utils.write_data_to_sql with each insertion method,
+loading randomly generated derived hdb features into the derived features table. Each load runs
+within a transaction that is rolled back, so the database is left unchanged.
+
+Usage:
+    python scripts/benchmark_sql_load.py --rows 200000 --methods copy multi
+"""
+import argparse
+import numpy as np
+import pandas as pd
+import sys
+import time
+
+sys.path.append("src")
+import hdb_resale_estimator as hdb_est
+
+
+def generate_derived_features(size: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Generates random derived hdb features with the column types of the derived features table"""
+    year_months = pd.to_datetime("2017-01-01") + pd.to_timedelta(
+        rng.integers(0, 72, size) * 31, unit="D"
+    )
+    data = pd.DataFrame(
+        {
+            "month": year_months.month,
+            "town": rng.choice(["BISHAN", "BEDOK", "TAMPINES", "YISHUN"], size),
+            "flat_type": rng.choice(["3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE"], size),
+            "block": rng.integers(1, 999, size).astype(str),
+            "street_name": rng.choice(["ANG MO KIO AVE 3", "BEDOK NTH ST 3", ""], size),
+            "storey_range": rng.choice(["01 TO 03", "04 TO 06", "07 TO 09"], size),
+            "floor_area_sqm": rng.uniform(40, 150, size).round(),
+            "flat_model": rng.choice(["Improved", "Model A", "New Generation"], size),
+            "lease_commence_date": rng.integers(1966, 2020, size),
+            "remaining_lease": rng.choice(["60 years", "75 years 03 months"], size),
+            "resale_price": rng.uniform(2e5, 1.2e6, size),
+            "region": rng.choice(["Central", "East", "North", "West"], size),
+            "year_month": year_months,
+            "year": year_months.year,
+            "lease_age": rng.integers(0, 55, size),
+            "latitude": rng.uniform(1.25, 1.45, size),
+            "longitude": rng.uniform(103.65, 104.0, size),
+        }
+    )
+    for amenity in ["malls", "schools", "parks", "MRT_stations"]:
+        data[f"no_of_{amenity}_within_2_km"] = rng.integers(0, 15, size)
+        data[f"distance_to_nearest_{amenity}"] = rng.uniform(0, 5, size)
+    # Flats that could not be geocoded have missing coordinates and amenity features
+    missing = rng.random(size) < 0.01
+    data.loc[missing, ["latitude", "longitude", "distance_to_nearest_malls"]] = np.nan
+    data["date_context"] = pd.Timestamp.now().normalize()
+
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--methods", nargs="+", default=["copy", "multi"])
+    parser.add_argument("--table-name", default="hdb_training_features")
+    args = parser.parse_args()
+
+    data = generate_derived_features(args.rows, np.random.default_rng(42))
+    db_engine = hdb_est.utils.create_postgres_engine()
+
+    print(f"{'method':>8} {'rows/s':>12} {'seconds':>9}")
+    for method in args.methods:
+        with db_engine.connect() as conn:
+            transaction = conn.begin()
+            try:
+                start_time = time.perf_counter()
+                hdb_est.utils.write_data_to_sql(
+                    conn, data, args.table_name, method=method
+                )
+                elapsed = time.perf_counter() - start_time
+            finally:
+                transaction.rollback()
+        print(f"{method:>8} {args.rows / elapsed:>12,.0f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
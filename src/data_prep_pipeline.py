@@ -2,8 +2,10 @@
 ## data_prep_pipeline.py retrieves the raw data and data prep configuration,
 and initialises data preparation
 """
+from datetime import datetime
 from hydra import compose, initialize
 import logging
+import sys
 
 import hdb_resale_estimator as hdb_est
 
@@ -14,52 +16,74 @@ def main():
     with hdb_est.utils.timer("Data Preparation"):
         hdb_est.utils.setup_logging()
         with initialize(version_base=None, config_path="../conf"):
-            data_prep_config = compose(config_name="data_prep")
+            data_prep_config = compose(config_name="data_prep", overrides=sys.argv[1:])
             logger.info("Starting data preparation pipeline")
             logger.info("Retrieving raw data and data preparation config...")
+            files_config = data_prep_config["files"]
+            raw_data_config = files_config["raw_data"]
 
-            logger.info("Performing data preparation in training mode...")
-            raw_hdb_data = hdb_est.utils.read_data(
-                source=data_prep_config["files"]["raw_data"][
-                    "read_from_source"
-                ],
-                params=data_prep_config["files"]["raw_data"]["params"],
-            )
-            logger.info("Shape of raw hdb data: %s", raw_hdb_data.shape)
+            # Only the months that are not in the latest snapshot are prepared and appended to it,
+            # unless a full rebuild into a new snapshot is requested
+            date_context, prepared_months = None, []
+            if not files_config["full_rebuild"]:
+                (
+                    date_context,
+                    prepared_months,
+                ) = hdb_est.data_prep.data_preparation.retrieve_latest_snapshot(
+                    files_config,
+                    data_prep_config["data_prep"]["feature_engineering"]["year_month"],
+                )
+            append_to_snapshot = date_context is not None
+            if append_to_snapshot:
+                logger.info("Appending new months to snapshot %s", date_context)
+            else:
+                date_context = datetime.now().strftime("%Y-%m-%d")
 
-            logger.info("Initialising data preparation...")
-            hdb_preprocessed = hdb_est.data_prep.data_preparation.data_prep_pipeline(
-                data_prep_config["data_prep"], raw_hdb_data
+            data_sink = hdb_est.data_prep.data_sink.create_data_sink(
+                files_config, append=append_to_snapshot
             )
-            number_of_nulls = hdb_preprocessed.isna().sum().sum()
-
             logger.info(
-                f"Data preparation completed. There are {number_of_nulls} null values present"
+                "Saving derived hdb features to %s...", files_config["save_to_source"]
             )
 
-        # Save clean and engineered mppa data
-        logger.info(
-            "Saving derived hdb features to %s...",
-            data_prep_config["files"]["save_to_source"],
-        )
-        if data_prep_config["files"]["save_to_source"] == "postgres":
-            db_engine = hdb_est.utils.create_postgres_engine()
-            derived_features_table_name = data_prep_config["files"][
-                "derived_features_table_name"
-            ]
-            hdb_est.utils.push_data_to_sql(
-                db_engine, hdb_preprocessed, derived_features_table_name
-            )
-            logger.info(
-                "Derived mppa features is saved in %s", derived_features_table_name
+            logger.info("Performing data preparation in training mode...")
+            if files_config["streaming"]["enabled"]:
+                logger.info(
+                    "Streaming raw hdb data in chunks of %s rows...",
+                    files_config["streaming"]["chunksize"],
+                )
+                raw_hdb_chunks = hdb_est.utils.read_data_chunks(
+                    source=raw_data_config["read_from_source"],
+                    params=raw_data_config["params"],
+                    chunksize=files_config["streaming"]["chunksize"],
+                )
+            else:
+                raw_hdb_data = hdb_est.utils.read_data(
+                    source=raw_data_config["read_from_source"],
+                    params=raw_data_config["params"],
+                )
+                logger.info("Shape of raw hdb data: %s", raw_hdb_data.shape)
+                raw_hdb_chunks = [raw_hdb_data]
+
+            logger.info("Initialising data preparation...")
+            (
+                number_of_rows,
+                number_of_nulls,
+            ) = hdb_est.data_prep.data_preparation.stream_data_prep_pipeline(
+                data_prep_config["data_prep"],
+                raw_hdb_chunks,
+                data_sink,
+                date_context=date_context,
+                prepared_months=prepared_months,
             )
 
-        elif data_prep_config["files"]["save_to_source"] == "local":
-            preprocessed_save_path = data_prep_config["files"][
-                "preprocessed_save_path"
-            ]
-            hdb_preprocessed.to_csv(preprocessed_save_path)
-            logger.info("Derived mppa features is saved in %s", preprocessed_save_path)
+            if number_of_rows == 0:
+                logger.info("No new months to prepare")
+            else:
+                logger.info(
+                    f"Data preparation completed. {number_of_rows} rows of derived hdb features "
+                    f"are saved, and there are {number_of_nulls} null values present"
+                )
 
 
 if __name__ == "__main__":
@@ -25,6 +25,8 @@ mlflow.set_tracking_uri(os.environ["MLFLOW_TRACKING_URI"])
 experiment_id = os.getenv("EXPERIMENT_ID")
 run_id = os.getenv("RUN_ID")
 builder = hdb_est.utils.retrieve_builder(experiment_id=experiment_id, run_id=run_id)
+# Compiles the fitted encoders once, so that each request is processed without pandas
+builder.compile_inference_layout()
 
 PRED_MODEL = builder.model
 PRED_MODEL_FEATURES = builder.objects["features"]  # before encoding
@@ -62,11 +64,9 @@ def predict_resale_value(hdb_flat_dict: dict):
         (data cleaning + feature engineering)
     """
 
-    hdb_flat_df = pd.DataFrame([hdb_flat_dict])[PRED_MODEL_FEATURES]
-    processed_hdb_flat_df = builder.process_inference_data(inference_data=hdb_flat_df)
-    result = PRED_MODEL.predict(processed_hdb_flat_df)
+    result = builder.predict_inference_dict(hdb_flat_dict)
 
-    return result.tolist()[0]
+    return result
 
 
 @app.post("/dataprep")
@@ -102,8 +102,7 @@ def generate_shap_values(hdb_flat_dict: dict):
         (data cleaning + feature engineering)
     """
 
-    hdb_flat_df = pd.DataFrame([hdb_flat_dict])[PRED_MODEL_FEATURES]
-    processed_hdb_flat_df = builder.process_inference_data(inference_data=hdb_flat_df)
+    processed_hdb_flat_df = builder.process_inference_dict(hdb_flat_dict, as_frame=True)
 
     if PRED_MODEL_EXPLAINER:
         shap_values = PRED_MODEL_EXPLAINER(processed_hdb_flat_df)
@@ -1,3 +1,4 @@
 from . import data_prep
+from . import geocoding
 from . import modeling
 from . import utils
\ No newline at end of file
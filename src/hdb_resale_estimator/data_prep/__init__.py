@@ -1,3 +1,7 @@
+from . import amenity_index
+from . import amenity_registry
 from . import data_cleaning
 from . import data_preparation
-from . import feature_engineering
\ No newline at end of file
+from . import data_sink
+from . import feature_engineering
+from . import feature_store
\ No newline at end of file
@@ -0,0 +1,502 @@
+"""
+amenity_index.py will contain the AmenityIndex engines used to find the nearest amenities
+for a batch of hdb flat transactions
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+import hdb_resale_estimator as hdb_est
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371
+
+
+def nearest_amenity_columns(amenity: str, radii: list, k_nearest: int) -> list:
+    """Generates the names of the nearest amenity features, in the order they are
+    returned by AmenityIndex.query
+
+    Args:
+        amenity (str): type of amenity (eg parks, schools, malls)
+        radii (list): radii around the flat
+        k_nearest (int): number of nearest amenities to find the distances of
+
+    Returns:
+        list: names of the nearest amenity features
+    """
+    columns = [f"no_of_{amenity}_within_{radius}_km" for radius in radii]
+    columns.append(f"distance_to_nearest_{amenity}")
+    columns.extend(
+        f"distance_to_nearest_{amenity}_{rank}" for rank in range(2, k_nearest + 1)
+    )
+    if k_nearest > 1:
+        columns.append(f"mean_distance_to_{k_nearest}_nearest_{amenity}")
+    columns.extend([f"nearest_{amenity}_coordinates", f"nearest_{amenity}_name"])
+
+    return columns
+
+
+class AmenityIndex(ABC):
+    """AmenityIndex class, not to be imported directly.
+
+    Args:
+        amenity_table (AmenityTable): amenity names, coordinates and opening year_months
+        year_month_feature (str): name of year_month feature
+    """
+
+    def __init__(self, amenity_table, year_month_feature: str) -> None:
+        self.amenity_table = amenity_table
+        self.period = amenity_table.period
+        self.year_month_feature = year_month_feature
+        self.amenity_coordinates = amenity_table.coordinates
+        self.amenity_names = amenity_table.names
+
+        # Period amenities are sorted by opening date, so that the amenities opened by
+        # each opening date (epoch) are the first epoch_ends amenities in opening_order
+        if self.period:
+            opening_year_months = amenity_table.year_months
+            self.opening_order = np.argsort(opening_year_months, kind="stable")
+            sorted_year_months = opening_year_months[self.opening_order]
+            self.epochs = np.unique(sorted_year_months)
+            self.epoch_ends = np.searchsorted(
+                sorted_year_months, self.epochs, side="right"
+            )
+
+    def _group_flats(
+        self, flat_transactions: pd.DataFrame, flat_coordinates: np.ndarray
+    ) -> list:
+        """Groups the flat transactions with valid coordinates by the amenities they are
+        compared against. For period amenities, each group contains the flat transactions
+        whose latest epoch at or before their year_month is the same
+
+        Args:
+            flat_transactions (pd.DataFrame): flat transaction details (eg year_month, coordinates)
+            flat_coordinates (np.ndarray): latitude and longitude of the flat transactions
+
+        Returns:
+            list: list of (flat transaction positions, amenity positions, epoch) tuples,
+            where epoch is None for amenities without period
+        """
+        valid_rows = np.isfinite(flat_coordinates).all(axis=1)
+
+        if not self.period:
+            return [
+                (
+                    np.flatnonzero(valid_rows),
+                    np.arange(len(self.amenity_coordinates)),
+                    None,
+                )
+            ]
+
+        transaction_epochs = (
+            np.searchsorted(
+                self.epochs,
+                flat_transactions[self.year_month_feature].to_numpy(),
+                side="right",
+            )
+            - 1
+        )
+        return [
+            (
+                np.flatnonzero(valid_rows & (transaction_epochs == epoch)),
+                self.opening_order[: self.epoch_ends[epoch]],
+                epoch,
+            )
+            for epoch in np.unique(transaction_epochs[valid_rows])
+            if epoch >= 0
+        ]
+
+    @abstractmethod
+    def query(
+        self,
+        flat_transactions: pd.DataFrame,
+        radii: list,
+        k_nearest: int,
+        latitude_feature: str,
+        longitude_feature: str,
+    ) -> pd.DataFrame:
+        """Finds the nearest amenities of every flat transaction
+
+        Args:
+            flat_transactions (pd.DataFrame): flat transaction details (eg year_month, coordinates)
+            radii (list): radii around the flat
+            k_nearest (int): number of nearest amenities to find the distances of
+            latitude_feature (str): name of latitude feature
+            longitude_feature (str): name of longitude feature
+
+        Returns:
+            pd.DataFrame: Dataframe containing the nearest_amenity_columns of each flat transaction
+        """
+
+    def parallel_query(
+        self,
+        flat_transactions: pd.DataFrame,
+        radii: list,
+        k_nearest: int,
+        latitude_feature: str,
+        longitude_feature: str,
+        n_jobs: int = 1,
+    ) -> pd.DataFrame:
+        """Splits the flat transactions into n_jobs chunks and queries them concurrently
+        on a thread pool. The BallTree queries and NumPy distance kernels release the GIL,
+        so the chunks run in parallel without copying the amenity data into other processes
+
+        Args:
+            flat_transactions (pd.DataFrame): flat transaction details (eg year_month, coordinates)
+            radii (list): radii around the flat
+            k_nearest (int): number of nearest amenities to find the distances of
+            latitude_feature (str): name of latitude feature
+            longitude_feature (str): name of longitude feature
+            n_jobs (int, optional): number of threads. Defaults to 1.
+
+        Returns:
+            pd.DataFrame: Dataframe containing the nearest_amenity_columns of each flat transaction
+        """
+        chunks = [
+            rows
+            for rows in np.array_split(np.arange(len(flat_transactions)), n_jobs)
+            if len(rows) > 0
+        ]
+        if len(chunks) <= 1:
+            return self.query(
+                flat_transactions, radii, k_nearest, latitude_feature, longitude_feature
+            )
+
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            nearest_amenities = list(
+                executor.map(
+                    lambda rows: self.query(
+                        flat_transactions.iloc[rows],
+                        radii,
+                        k_nearest,
+                        latitude_feature,
+                        longitude_feature,
+                    ),
+                    chunks,
+                )
+            )
+
+        return pd.concat(nearest_amenities, axis=0)
+
+    def _to_frame(
+        self,
+        index: pd.Index,
+        radii: list,
+        k_nearest: int,
+        counts: np.ndarray,
+        distances: np.ndarray,
+        nearest: np.ndarray,
+    ) -> pd.DataFrame:
+        """Assembles the query results into the same layout as utils.find_nearest_amenities.
+        As in a dataframe of its results, the counts are integers if every flat has valid coordinates,
+        and otherwise floats where flats without valid coordinates have NaN values
+
+        Args:
+            index (pd.Index): index of the flat transactions
+            radii (list): radii around the flat
+            k_nearest (int): number of nearest amenities to find the distances of
+            counts (np.ndarray): number of amenities within each radius, of shape (flats, radii)
+            distances (np.ndarray): distances to the k nearest amenities, of shape (flats, k_nearest)
+            nearest (np.ndarray): position of the nearest amenity, -1 if not found
+
+        Returns:
+            pd.DataFrame: Dataframe containing the nearest_amenity_columns of each flat transaction
+        """
+        found = nearest >= 0
+        nearest_coordinates = [
+            tuple(self.amenity_coordinates[position]) if position >= 0 else None
+            for position in nearest
+        ]
+        nearest_names = np.where(found, self.amenity_names[nearest], None)
+
+        feature_values = [counts[:, position] for position in range(len(radii))]
+        feature_values.extend(distances[:, rank] for rank in range(k_nearest))
+        if k_nearest > 1:
+            feature_values.append(np.nanmean(distances, axis=1))
+        if found.all():
+            feature_values[: len(radii)] = [
+                no_of_amenities.astype(int) for no_of_amenities in feature_values[: len(radii)]
+            ]
+        else:
+            feature_values = [
+                np.where(found, values, np.nan) for values in feature_values
+            ]
+
+        return pd.DataFrame(
+            dict(
+                zip(
+                    nearest_amenity_columns("amenity", radii, k_nearest),
+                    feature_values + [nearest_coordinates, nearest_names],
+                )
+            ),
+            index=index,
+        )
+
+
+class PerRowAmenityIndex(AmenityIndex):
+    """Original engine which scans every amenity once per flat transaction
+    using utils.find_nearest_amenities. Kept for parity testing."""
+
+    def __init__(self, amenity_table, year_month_feature: str) -> None:
+        super().__init__(amenity_table, year_month_feature)
+        self.amenity_details = amenity_table.to_frame(year_month_feature)
+
+    def query(
+        self,
+        flat_transactions: pd.DataFrame,
+        radii: list,
+        k_nearest: int,
+        latitude_feature: str,
+        longitude_feature: str,
+    ) -> pd.DataFrame:
+        if len(radii) != 1 or k_nearest != 1:
+            raise ValueError(
+                "per_row amenity index engine only supports a single radius and k_nearest of 1"
+            )
+
+        nearest_amenities = pd.DataFrame(
+            flat_transactions.progress_apply(
+                lambda flat_transaction: hdb_est.utils.find_nearest_amenities(
+                    flat_transaction,
+                    amenity_details=self.amenity_details,
+                    radius=radii[0],
+                    period=self.period,
+                    latitude_feature=latitude_feature,
+                    longitude_feature=longitude_feature,
+                    year_month_feature=self.year_month_feature,
+                    return_nearest_amenity=True,
+                ),
+                axis=1,
+            ).tolist(),
+            columns=nearest_amenity_columns("amenity", radii, k_nearest),
+            index=flat_transactions.index,
+        )
+
+        return nearest_amenities
+
+
+class BallTreeAmenityIndex(AmenityIndex):
+    """Engine which indexes the amenity coordinates in a haversine BallTree and
+    answers the nearest amenity queries of all flat transactions in one vectorized call.
+
+    For period amenities, the amenities are sorted by opening date and a BallTree snapshot
+    is built once for every opening date (epoch), covering the amenities opened by then.
+    Flat transactions are then grouped by the latest epoch at or before their year_month and
+    answered against that snapshot."""
+
+    def __init__(self, amenity_table, year_month_feature: str) -> None:
+        super().__init__(amenity_table, year_month_feature)
+
+        if self.period:
+            self.snapshots = [
+                self._build_tree(self.opening_order[:epoch_end])
+                for epoch_end in self.epoch_ends
+            ]
+        else:
+            self.tree = self._build_tree(np.arange(len(self.amenity_coordinates)))
+
+    def _build_tree(self, amenity_positions: np.ndarray) -> BallTree:
+        """Builds a haversine BallTree over a subset of the amenities
+
+        Args:
+            amenity_positions (np.ndarray): positions of the amenities to index
+
+        Returns:
+            BallTree: BallTree of the amenity coordinates in radians
+        """
+        return BallTree(
+            np.radians(self.amenity_coordinates[amenity_positions]), metric="haversine"
+        )
+
+    def _haversine_distances(
+        self,
+        flat_rows: np.ndarray,
+        amenity_positions: np.ndarray,
+        flat_coordinates: np.ndarray,
+    ) -> np.ndarray:
+        """Computes the haversine distances between pairs of flat transactions and amenities,
+        in the same way as utils.find_nearest_amenities
+
+        Args:
+            flat_rows (np.ndarray): position of the flat transaction of each pair
+            amenity_positions (np.ndarray): position of the amenity of each pair
+            flat_coordinates (np.ndarray): latitude and longitude of the flat transactions
+
+        Returns:
+            np.ndarray: distance of each pair in km
+        """
+        return hdb_est.utils.calculate_haversine_distance(
+            self.amenity_coordinates[amenity_positions, 0],
+            self.amenity_coordinates[amenity_positions, 1],
+            flat_coordinates[flat_rows, 0],
+            flat_coordinates[flat_rows, 1],
+            earth_radius=EARTH_RADIUS,
+        )
+
+    def query(
+        self,
+        flat_transactions: pd.DataFrame,
+        radii: list,
+        k_nearest: int,
+        latitude_feature: str,
+        longitude_feature: str,
+    ) -> pd.DataFrame:
+        flat_coordinates = flat_transactions[
+            [latitude_feature, longitude_feature]
+        ].to_numpy(dtype=float)
+        groups = [
+            (rows, amenity_positions, self.tree if epoch is None else self.snapshots[epoch])
+            for rows, amenity_positions, epoch in self._group_flats(
+                flat_transactions, flat_coordinates
+            )
+        ]
+
+        counts = np.full((len(flat_coordinates), len(radii)), np.nan)
+        distances = np.full((len(flat_coordinates), k_nearest), np.nan)
+        nearest = np.full(len(flat_coordinates), -1)
+        for rows, amenity_positions, tree in groups:
+            if len(rows) == 0:
+                continue
+            query_coordinates = np.radians(flat_coordinates[rows])
+            k = min(k_nearest, len(amenity_positions))
+            nearest_positions = tree.query(
+                query_coordinates, k=k, return_distance=False
+            )
+
+            # The BallTree only finds the neighbours. Their distances are recomputed with
+            # utils.calculate_haversine_distance, so that they are bit-identical to the per_row engine
+            nearest_distances = self._haversine_distances(
+                np.repeat(rows, k),
+                amenity_positions[nearest_positions.ravel()],
+                flat_coordinates,
+            ).reshape(-1, k)
+            rank_order = np.argsort(nearest_distances, axis=1, kind="stable")
+            distances[rows, :k] = np.take_along_axis(
+                nearest_distances, rank_order, axis=1
+            )
+            nearest[rows] = amenity_positions[
+                np.take_along_axis(nearest_positions, rank_order[:, :1], axis=1)[:, 0]
+            ]
+
+            # Amenities within the largest radius are found in one pass, and counted for each radius.
+            # The search radius is padded slightly so that amenities on the boundary are kept
+            radius_positions = tree.query_radius(
+                query_coordinates, r=max(radii) / EARTH_RADIUS * (1 + 1e-9)
+            )
+            flat_positions = np.repeat(
+                np.arange(len(rows)),
+                [len(flat_amenities) for flat_amenities in radius_positions],
+            )
+            radius_distances = self._haversine_distances(
+                rows[flat_positions],
+                amenity_positions[np.concatenate(radius_positions).astype(int)],
+                flat_coordinates,
+            )
+            for position, radius in enumerate(radii):
+                counts[rows, position] = np.bincount(
+                    flat_positions[radius_distances <= radius], minlength=len(rows)
+                )
+
+        return self._to_frame(
+            flat_transactions.index, radii, k_nearest, counts, distances, nearest
+        )
+
+
+class BlockedHaversineAmenityIndex(AmenityIndex):
+    """Engine which computes the haversine distances between the flat transactions and
+    every amenity in chunks of flat transactions with utils.blocked_haversine_nearest, so that
+    peak memory is bounded by the chunk size instead of the number of flat transactions
+
+    Args:
+        chunk_size (int, optional): number of flat transactions per chunk. Defaults to 4096.
+        dtype (str, optional): float precision of the distance computation. Defaults to "float32".
+    """
+
+    def __init__(
+        self,
+        amenity_table,
+        year_month_feature: str,
+        chunk_size: int = 4096,
+        dtype: str = "float32",
+    ) -> None:
+        super().__init__(amenity_table, year_month_feature)
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+
+    def query(
+        self,
+        flat_transactions: pd.DataFrame,
+        radii: list,
+        k_nearest: int,
+        latitude_feature: str,
+        longitude_feature: str,
+    ) -> pd.DataFrame:
+        flat_coordinates = flat_transactions[
+            [latitude_feature, longitude_feature]
+        ].to_numpy(dtype=float)
+
+        counts = np.full((len(flat_coordinates), len(radii)), np.nan)
+        distances = np.full((len(flat_coordinates), k_nearest), np.nan)
+        nearest = np.full(len(flat_coordinates), -1)
+        for rows, amenity_positions, _ in self._group_flats(
+            flat_transactions, flat_coordinates
+        ):
+            if len(rows) == 0:
+                continue
+            (
+                counts[rows],
+                distances[rows],
+                nearest_positions,
+            ) = hdb_est.utils.blocked_haversine_nearest(
+                flat_coordinates[rows],
+                self.amenity_coordinates[amenity_positions],
+                radii=radii,
+                k_nearest=k_nearest,
+                chunk_size=self.chunk_size,
+                dtype=self.dtype,
+                earth_radius=EARTH_RADIUS,
+            )
+            nearest[rows] = amenity_positions[nearest_positions[:, 0]]
+
+        return self._to_frame(
+            flat_transactions.index, radii, k_nearest, counts, distances, nearest
+        )
+
+
+AMENITY_INDEX_ENGINES = {
+    "per_row": PerRowAmenityIndex,
+    "balltree": BallTreeAmenityIndex,
+    "blocked": BlockedHaversineAmenityIndex,
+}
+
+
+def create_amenity_index(
+    engine: str,
+    amenity_table,
+    year_month_feature: str,
+    **engine_params,
+) -> AmenityIndex:
+    """Initiates the amenity index engine specified in the config
+
+    Args:
+        engine (str): name of the engine (eg balltree, blocked, per_row)
+        amenity_table (AmenityTable): amenity names, coordinates and opening year_months
+        year_month_feature (str): name of year_month feature
+        **engine_params: engine specific params (eg chunk_size and dtype of the blocked engine)
+
+    Raises:
+        NameError: Engine name given was incorrect
+
+    Returns:
+        AmenityIndex: amenity index built on the amenity table
+    """
+    if engine not in AMENITY_INDEX_ENGINES:
+        raise NameError(f"Incorrect amenity index engine, '{engine}' was given")
+
+    return AMENITY_INDEX_ENGINES[engine](
+        amenity_table, year_month_feature, **engine_params
+    )
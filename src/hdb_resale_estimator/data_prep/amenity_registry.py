@@ -0,0 +1,252 @@
+"""
+amenity_registry.py will contain the AmenityRegistry class to load each amenity table once
+per process and share it between FeatureEngineer instances
+"""
+import hashlib
+import json
+import logging
+import numpy as np
+import os
+import pandas as pd
+import threading
+
+import hdb_resale_estimator as hdb_est
+
+logger = logging.getLogger(__name__)
+
+
+class AmenityTable:
+    """AmenityTable class holds the details of one amenity table as NumPy arrays
+
+    Args:
+        names (np.ndarray): name of each amenity
+        coordinates (np.ndarray): latitude and longitude of each amenity, of shape (amenities, 2)
+        year_months (np.ndarray): opening year_month of each amenity, None for amenities without period
+        content_hash (str): content hash of the amenity data
+    """
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        coordinates: np.ndarray,
+        year_months: np.ndarray,
+        content_hash: str,
+    ) -> None:
+        self.names = names
+        self.coordinates = coordinates
+        self.year_months = year_months
+        self.content_hash = content_hash
+
+    @property
+    def period(self) -> bool:
+        """Whether the opening date of the amenities is taken into account"""
+        return self.year_months is not None
+
+    def to_frame(self, year_month_feature: str) -> pd.DataFrame:
+        """Converts the amenity table into the dataframe layout used by utils.find_nearest_amenities
+
+        Args:
+            year_month_feature (str): name of year_month feature
+
+        Returns:
+            pd.DataFrame: amenity details (eg address, coordinates, year_month)
+        """
+        amenity_details = pd.DataFrame(
+            {
+                "address": self.names,
+                "LATITUDE": self.coordinates[:, 0],
+                "LONGITUDE": self.coordinates[:, 1],
+            }
+        )
+        if self.period:
+            amenity_details[year_month_feature] = self.year_months
+
+        return amenity_details
+
+
+class AmenityRegistry:
+    """AmenityRegistry class loads, renames and converts the dates of each amenity table once,
+    and caches the resulting AmenityTable (and the amenity indices built on it) by file path
+    and modification time, so that a changed file is reloaded on its next use.
+
+    Args:
+        directory (str, optional): directory that relative amenity data paths are resolved against.
+                                   Defaults to None.
+    """
+
+    def __init__(self, directory: str = None) -> None:
+        self.directory = directory
+        self._tables = {}
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def _resolve_params(self, amenities_data: dict) -> dict:
+        """Copies the params to read the amenity data, prefixing the data path with the directory
+
+        Args:
+            amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
+
+        Returns:
+            dict: params to read the amenity data
+        """
+        read_params = dict(amenities_data["params"])
+        if self.directory and "data_path" in read_params:
+            read_params["data_path"] = os.path.join(
+                self.directory, read_params["data_path"]
+            )
+
+        return read_params
+
+    def _cache_key(self, amenities_data: dict, period: bool) -> tuple:
+        """Generates the cache key and version of an amenity table. The version is the
+        modification time of the amenity data file, or None for other data sources
+
+        Args:
+            amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
+            period (bool): whether to take into account the opening date of the amenity
+
+        Returns:
+            tuple: cache key and version of the amenity table
+        """
+        source = amenities_data["read_from_source"]
+        read_params = self._resolve_params(amenities_data)
+        data_path = read_params.get("data_path")
+        version = (
+            os.stat(data_path).st_mtime_ns
+            if source == "csv" and data_path is not None
+            else None
+        )
+        key = (source, json.dumps(read_params, sort_keys=True, default=str), period)
+
+        return key, version
+
+    def _load_table(self, amenities_data: dict, period: bool) -> AmenityTable:
+        """Reads an amenity table from its data source
+
+        Args:
+            amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
+            period (bool): whether to take into account the opening date of the amenity
+
+        Returns:
+            AmenityTable: amenity table
+        """
+        amenity_details = hdb_est.utils.read_data(
+            source=amenities_data["read_from_source"],
+            params=self._resolve_params(amenities_data),
+        )
+        content_hash = hashlib.sha1(
+            pd.util.hash_pandas_object(amenity_details, index=False).to_numpy()
+        ).hexdigest()
+
+        year_months = None
+        if period:
+            amenity_details = amenity_details.rename(
+                columns={"Opening year": "YEAR", "Opening month": "MONTH", "Name": "address"}
+            )
+            year_months = pd.to_datetime(
+                amenity_details[["YEAR", "MONTH"]].assign(DAY=1)
+            ).to_numpy()
+
+        return AmenityTable(
+            names=amenity_details["address"].to_numpy(),
+            coordinates=amenity_details[["LATITUDE", "LONGITUDE"]].to_numpy(dtype=float),
+            year_months=year_months,
+            content_hash=content_hash,
+        )
+
+    def get_table(self, amenities_data: dict, period: bool) -> AmenityTable:
+        """Gets an amenity table, loading it if it is not cached or its data file has changed
+
+        Args:
+            amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
+            period (bool): whether to take into account the opening date of the amenity
+
+        Returns:
+            AmenityTable: amenity table
+        """
+        key, version = self._cache_key(amenities_data, period)
+        with self._lock:
+            cached = self._tables.get(key)
+            if cached is None or cached[0] != version:
+                logger.info(
+                    "Loading amenity data from %s...",
+                    self._resolve_params(amenities_data).get("data_path"),
+                )
+                cached = (
+                    version,
+                    self._load_table(amenities_data, period),
+                )
+                self._tables[key] = cached
+
+        return cached[1]
+
+    def get_index(
+        self,
+        engine: str,
+        amenities_data: dict,
+        period: bool,
+        year_month_feature: str,
+        **engine_params,
+    ):
+        """Gets the amenity index of an amenity table, building it if it is not cached
+        or the amenity table has changed
+
+        Args:
+            engine (str): amenity index engine (eg balltree, blocked, per_row)
+            amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
+            period (bool): whether to take into account the opening date of the amenity
+            year_month_feature (str): name of year_month feature
+            **engine_params: engine specific params (eg chunk_size and dtype of the blocked engine)
+
+        Returns:
+            AmenityIndex: amenity index built on the amenity table
+        """
+        amenity_table = self.get_table(amenities_data, period)
+        key = (
+            self._cache_key(amenities_data, period)[0],
+            engine,
+            json.dumps(engine_params, sort_keys=True, default=str),
+            year_month_feature,
+        )
+        with self._lock:
+            cached = self._indices.get(key)
+            if cached is None or cached[0] is not amenity_table:
+                cached = (
+                    amenity_table,
+                    hdb_est.data_prep.amenity_index.create_amenity_index(
+                        engine=engine,
+                        amenity_table=amenity_table,
+                        year_month_feature=year_month_feature,
+                        **engine_params,
+                    ),
+                )
+                self._indices[key] = cached
+
+        return cached[1]
+
+    def clear(self) -> None:
+        """Removes every cached amenity table and index"""
+        with self._lock:
+            self._tables.clear()
+            self._indices.clear()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_amenity_registry(directory: str = None) -> AmenityRegistry:
+    """Gets the amenity registry of a directory shared within the process
+
+    Args:
+        directory (str, optional): directory that relative amenity data paths are resolved against.
+                                   Defaults to None.
+
+    Returns:
+        AmenityRegistry: shared amenity registry
+    """
+    with _registries_lock:
+        if directory not in _registries:
+            _registries[directory] = AmenityRegistry(directory=directory)
+
+        return _registries[directory]
@@ -1,8 +1,12 @@
 """
 data_cleaning.py will contain the neccessary DataCleaner class to clean, filter and impute the raw hdb data
 """
+import json
 import logging
+import numpy as np
+import os
 import pandas as pd
+import threading
 
 import hdb_resale_estimator as hdb_est
 
@@ -13,12 +17,17 @@ class DataCleaner:
     """DataCleaner class will be used to clean, impute and filter the hdb data"""
 
     def __init__(
-        self, raw_hdb_data: pd.DataFrame, params: dict, inference_mode: bool = False
+        self,
+        raw_hdb_data: pd.DataFrame,
+        params: dict,
+        inference_mode: bool = False,
+        cpi_lookup: "CPILookup" = None,
     ) -> None:
         self.raw_hdb_data = raw_hdb_data
         self.month_feature = params["month"]
         self.data_cleaning_params = params["data_cleaning"]
         self.inference_mode = inference_mode
+        self.cpi_lookup = cpi_lookup
 
     def clean_data(self) -> pd.DataFrame:
         """Takes in raw hdb data, performs cleaning and filtering
@@ -28,15 +37,40 @@ class DataCleaner:
             cleaned_df (pd.DataFrame): cleaned and filtered hdb data
         """
 
+        self.convert_categoricals(self.data_cleaning_params["categorical_features"])
         self.remove_flat_types(self.data_cleaning_params["remove_flat_types"])
         self.remove_flat_models(self.data_cleaning_params["remove_flat_models"])
         self.replace_flat_models(self.data_cleaning_params["replace_flat_models"])
         self.change_dtype()
         if not self.inference_mode:
             self.adjust_resale(self.data_cleaning_params["adjust_resale"])
+        self.restore_categoricals(self.data_cleaning_params["categorical_features"])
 
         return self.raw_hdb_data
 
+    def convert_categoricals(self, categorical_features: list):
+        """Function to convert the categorical features into categorical dtypes, so that
+        they are normalized and filtered on their categories instead of on every row.
+        The features are converted on a shallow copy, so the raw hdb data passed in is not modified
+
+        Args:
+            categorical_features (list): names of categorical features
+        """
+        self.raw_hdb_data = self.raw_hdb_data.copy(deep=False)
+        for feature in categorical_features:
+            if not isinstance(self.raw_hdb_data[feature].dtype, pd.CategoricalDtype):
+                self.raw_hdb_data[feature] = self.raw_hdb_data[feature].astype("category")
+
+    def restore_categoricals(self, categorical_features: list):
+        """Function to convert the categorical features back into object dtypes once cleaned,
+        so that the cleaned hdb data has the same dtypes as before they were cleaned as categoricals
+
+        Args:
+            categorical_features (list): names of categorical features
+        """
+        for feature in categorical_features:
+            self.raw_hdb_data[feature] = self.raw_hdb_data[feature].astype(object)
+
     def remove_flat_types(self, params: dict):
         """Function to remove unwanted flat types
 
@@ -46,9 +80,9 @@ class DataCleaner:
         flat_type_feature = params["flat_type"]
 
         self.raw_hdb_data = self.raw_hdb_data[
-            ~self.raw_hdb_data[flat_type_feature].isin(params["remove"])
+            ~category_mask(self.raw_hdb_data[flat_type_feature], params["remove"])
         ]
-    
+
     def remove_flat_models(self, params: dict):
         """Function to remove unwanted flat models
 
@@ -58,22 +92,31 @@ class DataCleaner:
         flat_type_feature = params["flat_type"]
 
         self.raw_hdb_data = self.raw_hdb_data[
-            ~self.raw_hdb_data[flat_type_feature].isin(params["remove"])
+            ~category_mask(self.raw_hdb_data[flat_type_feature], params["remove"])
         ]
 
     def replace_flat_models(self, params: dict):
-        """Function to replace flat models with specific values
+        """Function to replace flat models with specific values. The flat models are
+        uppercased and replaced on the categories, and the code of each row is remapped
+        to the resulting categories
+
         Args:
             params (dict): Config params
         """
         flat_model_feature = params["flat_model"]
+        flat_models = self.raw_hdb_data[flat_model_feature].array
 
-        self.raw_hdb_data[flat_model_feature] = self.raw_hdb_data[
-            flat_model_feature
-        ].apply(lambda x: x.upper())
-        self.raw_hdb_data[flat_model_feature] = self.raw_hdb_data[
-            flat_model_feature
-        ].replace(params["replace"])
+        replaced_categories = flat_models.categories.str.upper().map(
+            lambda flat_model: params["replace"].get(flat_model, flat_model)
+        )
+        # Categories which become the same flat model (eg Improved and IMPROVED) are merged
+        category_codes, categories = pd.factorize(replaced_categories)
+        codes = np.where(
+            flat_models.codes >= 0, category_codes[flat_models.codes], -1
+        )
+        self.raw_hdb_data[flat_model_feature] = pd.Categorical.from_codes(
+            codes, categories=categories
+        )
 
     def change_dtype(self):
         """Function to change data types of certain columns"""
@@ -90,16 +133,138 @@ class DataCleaner:
             params (dict): Config params
         """
         resale_price_feature = params["resale_price"]
-        cpi_data = params["cpi_data"]
-        source = cpi_data["read_from_source"]
-        read_params = cpi_data["params"]
-
-        cpi_data = hdb_est.utils.read_data(source=source, params=read_params)
-        cpi_data[self.month_feature] = pd.to_datetime(cpi_data[self.month_feature])
-        self.raw_hdb_data = pd.merge(
-            self.raw_hdb_data, cpi_data, how="left", on=self.month_feature
-        )
-        self.raw_hdb_data[["cpi"]] = self.raw_hdb_data[["cpi"]].fillna(value=100)
+        cpi_lookup = self.cpi_lookup or get_cpi_lookup(params, self.month_feature)
+        cpi = cpi_lookup.lookup(self.raw_hdb_data[self.month_feature])
+
         self.raw_hdb_data[resale_price_feature] = (
-            self.raw_hdb_data[resale_price_feature] / self.raw_hdb_data["cpi"]
+            self.raw_hdb_data[resale_price_feature].to_numpy(dtype=float) / cpi
         ) * 100
+        # Renumbers the transactions without copying them, as the previous merge did
+        self.raw_hdb_data.index = pd.RangeIndex(len(self.raw_hdb_data))
+
+
+class CPILookup:
+    """CPILookup class holds the consumer price index of each month in an array indexed by
+    months since epoch, so that the consumer price index of each transaction is looked up
+    with one gather
+
+    Args:
+        cpi_data (pd.DataFrame): Dataframe containing the consumer price index of each month
+        month_feature (str): name of month feature
+    """
+
+    def __init__(self, cpi_data: pd.DataFrame, month_feature: str) -> None:
+        months = months_since_epoch(cpi_data[month_feature]).astype(np.int64)
+        self.first_month = int(months.min())
+        self.cpi = np.full(int(months.max()) - self.first_month + 1, np.nan)
+        self.cpi[months - self.first_month] = cpi_data["cpi"].to_numpy(dtype=float)
+
+    def lookup(self, months: pd.Series) -> np.ndarray:
+        """Looks up the consumer price index of each month
+
+        Args:
+            months (pd.Series): month of each transaction
+
+        Returns:
+            np.ndarray: consumer price index of each month, 100 for months without one
+        """
+        months = months_since_epoch(months)
+        positions = np.where(
+            np.isnat(months), -1, months.astype(np.int64) - self.first_month
+        )
+        valid = (positions >= 0) & (positions < len(self.cpi))
+
+        cpi = np.full(len(positions), 100.0)
+        cpi[valid] = self.cpi[positions[valid]]
+        cpi[np.isnan(cpi)] = 100
+
+        return cpi
+
+
+def months_since_epoch(months: pd.Series) -> np.ndarray:
+    """Function to convert months into months since epoch
+
+    Args:
+        months (pd.Series): months
+
+    Returns:
+        np.ndarray: months since epoch (datetime64[M]), NaT for missing months
+    """
+    return pd.to_datetime(months).to_numpy().astype("datetime64[M]")
+
+
+def category_mask(feature: pd.Series, values: list) -> np.ndarray:
+    """Function to find the rows of a categorical feature with any of the given values,
+    by comparing the category codes
+
+    Args:
+        feature (pd.Series): categorical feature
+        values (list): values to find
+
+    Returns:
+        np.ndarray: boolean mask of the rows with any of the values
+    """
+    value_codes = feature.cat.categories.get_indexer(values)
+
+    return np.isin(feature.cat.codes.to_numpy(), value_codes[value_codes >= 0])
+
+
+_cpi_lookups = {}
+_cpi_lookups_lock = threading.Lock()
+
+
+def get_cpi_lookup(params: dict, month_feature: str) -> CPILookup:
+    """Function to get the consumer price index lookup shared within the process, reading the
+    consumer price index data if it is not cached or its data file has changed
+
+    Args:
+        params (dict): Config params of adjust_resale
+        month_feature (str): name of month feature
+
+    Returns:
+        CPILookup: consumer price index lookup
+    """
+    cpi_data = params["cpi_data"]
+    read_params = dict(cpi_data["params"])
+    data_path = read_params.get("data_path")
+    version = (
+        os.stat(data_path).st_mtime_ns
+        if cpi_data["read_from_source"] == "csv" and data_path is not None
+        else None
+    )
+    key = json.dumps(
+        [cpi_data["read_from_source"], read_params, month_feature],
+        sort_keys=True,
+        default=str,
+    )
+
+    with _cpi_lookups_lock:
+        cached = _cpi_lookups.get(key)
+        if cached is None or cached[0] != version:
+            cached = (
+                version,
+                CPILookup(read_cpi_data(params, month_feature), month_feature),
+            )
+            _cpi_lookups[key] = cached
+
+    return cached[1]
+
+
+def read_cpi_data(params: dict, month_feature: str) -> pd.DataFrame:
+    """Function to read the consumer price index of each month
+
+    Args:
+        params (dict): Config params of adjust_resale
+        month_feature (str): name of month feature
+
+    Returns:
+        pd.DataFrame: Dataframe containing the consumer price index of each month
+    """
+    cpi_data = params["cpi_data"]
+    source = cpi_data["read_from_source"]
+    read_params = cpi_data["params"]
+
+    cpi_data = hdb_est.utils.read_data(source=source, params=read_params)
+    cpi_data[month_feature] = pd.to_datetime(cpi_data[month_feature])
+
+    return cpi_data
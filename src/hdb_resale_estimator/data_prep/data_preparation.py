@@ -3,9 +3,12 @@
 ## 1. Data Cleaning
 ## 2. Feature Engineering
 """
+import glob
 import logging
 from omegaconf import DictConfig
+import os
 import pandas as pd
+from typing import Iterable, Tuple
 
 import hdb_resale_estimator as hdb_est
 
@@ -15,9 +18,17 @@ logger = logging.getLogger(__name__)
 def data_prep_pipeline(
     config: DictConfig,
     raw_hdb_data: pd.DataFrame,
+    date_context: str = None,
 ) -> None:
     """This is a wrapper function to clean the data and perform feature engineering to
-    prep the data for model training"""
+    prep the data for model training
+
+    Args:
+        config (DictConfig): data prep config
+        raw_hdb_data (pd.DataFrame): raw hdb transactions to prepare
+        date_context (str, optional): date_context snapshot the prepared data belongs to.
+                                      Defaults to None, which starts a new snapshot dated today.
+    """
 
     logger.info("Initialising Data cleaner...")
     data_cleaner = hdb_est.data_prep.data_cleaning.DataCleaner(
@@ -35,7 +46,7 @@ def data_prep_pipeline(
     # Initialize feature engineer
     logger.info("Initialising Feature Engineering...")
     feature_engineer = hdb_est.data_prep.feature_engineering.FeatureEngineer(
-        params=config
+        params=config, date_context=date_context
     )
 
     # Engineer features
@@ -47,3 +58,124 @@ def data_prep_pipeline(
         logger.info("Shape of hdb derived features: %s", derived_data_hdb.shape)
 
     return derived_data_hdb
+
+
+def stream_data_prep_pipeline(
+    config: DictConfig,
+    raw_hdb_chunks: Iterable[pd.DataFrame],
+    data_sink,
+    date_context: str,
+    prepared_months: list = None,
+) -> Tuple[int, int]:
+    """This is a wrapper function to clean the data and perform feature engineering chunk by chunk,
+    writing each chunk of derived features straight into the data sink. The lookup tables
+    (eg consumer price index, flat coordinates, amenities) are read once and shared between chunks,
+    so that peak memory is bounded by the chunk size
+
+    Args:
+        config (DictConfig): data prep config
+        raw_hdb_chunks (Iterable[pd.DataFrame]): chunks of raw hdb transactions to prepare
+        data_sink (DataSink): data sink to write the derived features into
+        date_context (str): date_context snapshot the prepared data belongs to
+        prepared_months (list, optional): year_months that have been prepared, whose raw hdb
+                                          transactions are skipped. Defaults to None.
+
+    Returns:
+        Tuple[int, int]: number of rows and number of null values of the derived features
+    """
+    cpi_lookup = hdb_est.data_prep.data_cleaning.get_cpi_lookup(
+        config["data_cleaning"]["adjust_resale"], config["month"]
+    )
+    feature_engineer = hdb_est.data_prep.feature_engineering.FeatureEngineer(
+        params=config, date_context=date_context
+    )
+
+    number_of_nulls = 0
+    with data_sink:
+        for chunk_number, raw_hdb_chunk in enumerate(raw_hdb_chunks, start=1):
+            if prepared_months:
+                raw_hdb_chunk = filter_new_months(
+                    raw_hdb_chunk, config["month"], prepared_months
+                )
+
+            clean_hdb_chunk = hdb_est.data_prep.data_cleaning.DataCleaner(
+                raw_hdb_data=raw_hdb_chunk, params=config, cpi_lookup=cpi_lookup
+            ).clean_data()
+            if len(clean_hdb_chunk) == 0:
+                continue
+
+            derived_hdb_chunk = feature_engineer.engineer_features(
+                hdb_data=clean_hdb_chunk
+            )
+            data_sink.write(derived_hdb_chunk)
+            number_of_nulls += derived_hdb_chunk.isna().sum().sum()
+            logger.info(
+                "Prepared chunk %s, %s rows of derived features written",
+                chunk_number,
+                data_sink.number_of_rows,
+            )
+
+    return data_sink.number_of_rows, number_of_nulls
+
+
+def retrieve_latest_snapshot(files_config: DictConfig, year_month_feature: str) -> Tuple[str, list]:
+    """Retrieves the latest date_context snapshot of the derived features and the year_months
+    already prepared in it, from the source the derived features are saved to
+
+    Args:
+        files_config (DictConfig): files config of the data prep pipeline
+        year_month_feature (str): name of year_month feature
+
+    Returns:
+        Tuple[str, list]: latest date_context and its year_months, None and an empty list
+        if there is no snapshot yet
+    """
+    if files_config["save_to_source"] == "postgres":
+        return hdb_est.utils.extract_snapshot_months(
+            files_config["derived_features_table_name"], year_month_feature
+        )
+
+    if files_config["save_to_source"] == "parquet":
+        preprocessed_save_dir = files_config["preprocessed_parquet_save_dir"]
+        if not glob.glob(os.path.join(preprocessed_save_dir, "*.parquet")):
+            return None, []
+        snapshots = pd.read_parquet(
+            preprocessed_save_dir, columns=["date_context", year_month_feature]
+        )
+
+    else:
+        preprocessed_save_path = files_config["preprocessed_save_path"]
+        if not os.path.exists(preprocessed_save_path):
+            return None, []
+        snapshots = pd.read_csv(
+            preprocessed_save_path, usecols=["date_context", year_month_feature]
+        )
+    if len(snapshots) == 0:
+        return None, []
+    date_context = snapshots["date_context"].max()
+
+    return (
+        date_context,
+        snapshots.loc[
+            snapshots["date_context"] == date_context, year_month_feature
+        ].unique().tolist(),
+    )
+
+
+def filter_new_months(
+    raw_hdb_data: pd.DataFrame, month_feature: str, prepared_months: list
+) -> pd.DataFrame:
+    """Filters the raw hdb transactions of the months that have not been prepared
+
+    Args:
+        raw_hdb_data (pd.DataFrame): raw hdb transactions
+        month_feature (str): name of month feature (eg 2017-01)
+        prepared_months (list): year_months that have been prepared
+
+    Returns:
+        pd.DataFrame: raw hdb transactions of the new months
+    """
+    prepared_months = pd.to_datetime(pd.Series(prepared_months, dtype=object)).unique()
+    new_months = ~pd.to_datetime(raw_hdb_data[month_feature]).isin(prepared_months)
+
+    return raw_hdb_data[new_months.to_numpy()].reset_index(drop=True)
@@ -0,0 +1,247 @@
+"""
+data_sink.py will contain the DataSink classes to write the derived hdb features
+chunk by chunk into the source they are saved to
+"""
+from abc import ABC, abstractmethod
+import glob
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+from pyarrow import parquet as pq
+import tempfile
+import uuid
+
+import hdb_resale_estimator as hdb_est
+
+logger = logging.getLogger(__name__)
+
+
+class DataSink(ABC):
+    """DataSink class, not to be imported directly. Data sinks are used as context managers,
+    and only commit the chunks written if the context exits without errors.
+
+    Args:
+        append (bool): whether to append to the existing data instead of replacing it
+    """
+
+    def __init__(self, append: bool) -> None:
+        self.append = append
+        self.number_of_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close(commit=exc_type is None)
+
+    def write(self, data: pd.DataFrame) -> None:
+        """Writes a chunk of derived hdb features
+
+        Args:
+            data (pd.DataFrame): chunk of derived hdb features
+        """
+        if self.append and self.number_of_rows == 0:
+            self.check_columns(list(data.columns), self.existing_columns())
+        self._write(data)
+        self.number_of_rows += len(data)
+
+    def check_columns(self, columns: list, existing_columns: list) -> None:
+        """Checks that the chunks appended have the same columns as the existing data
+
+        Args:
+            columns (list): columns of the chunk of derived hdb features
+            existing_columns (list): columns of the existing data, None if they are not checked
+
+        Raises:
+            ValueError: Columns of the chunk differ from the existing data
+        """
+        if existing_columns is not None and columns != existing_columns:
+            raise ValueError(
+                f"Columns of the derived hdb features {columns} differ from the existing "
+                f"{existing_columns}, rebuild them with files.full_rebuild=True"
+            )
+
+    def existing_columns(self) -> list:
+        """Gets the columns of the existing data the chunks are appended to
+
+        Returns:
+            list: columns of the existing data, None if they are not checked
+        """
+        return None
+
+    @abstractmethod
+    def _write(self, data: pd.DataFrame) -> None:
+        """Writes a chunk of derived hdb features into the sink
+
+        Args:
+            data (pd.DataFrame): chunk of derived hdb features
+        """
+
+    @abstractmethod
+    def close(self, commit: bool = True) -> None:
+        """Commits or discards the chunks written
+
+        Args:
+            commit (bool, optional): whether to commit the chunks written. Defaults to True.
+        """
+
+
+class CSVDataSink(DataSink):
+    """Writes the derived hdb features into a csv file. When replacing the csv file, the chunks
+    are written into a temporary file which replaces the csv file on commit.
+
+    Args:
+        save_path (str): file path of the csv file
+    """
+
+    def __init__(self, save_path: str, append: bool) -> None:
+        super().__init__(append)
+        self.save_path = save_path
+        self.write_path = None
+
+    def existing_columns(self) -> list:
+        return pd.read_csv(self.save_path, nrows=0).columns.tolist()
+
+    def _write(self, data: pd.DataFrame) -> None:
+        header = False
+        if self.write_path is None:
+            header = not self.append
+            if self.append:
+                self.write_path = self.save_path
+            else:
+                save_dir = os.path.dirname(self.save_path) or "."
+                os.makedirs(save_dir, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    dir=save_dir, suffix=".csv", delete=False
+                ) as file:
+                    self.write_path = file.name
+
+        # The index of each chunk restarts from 0, so it is not written
+        data.to_csv(
+            self.write_path, mode="w" if header else "a", header=header, index=False
+        )
+
+    def close(self, commit: bool = True) -> None:
+        if self.write_path is None or self.append:
+            return
+        if commit:
+            os.replace(self.write_path, self.save_path)
+        else:
+            os.remove(self.write_path)
+
+
+class ParquetDataSink(DataSink):
+    """Writes the derived hdb features into a Parquet dataset directory. Each run writes its chunks
+    as row groups of a new part file, which is only added to the dataset on commit. When replacing
+    the dataset, the part files of previous runs are removed on commit.
+
+    Args:
+        save_dir (str): directory of the Parquet dataset
+    """
+
+    def __init__(self, save_dir: str, append: bool) -> None:
+        super().__init__(append)
+        self.save_dir = save_dir
+        self.part_path = os.path.join(save_dir, f"part-{uuid.uuid4().hex}.parquet")
+        self.writer = None
+        self.existing_schema = None
+
+    def existing_columns(self) -> list:
+        part_paths = sorted(glob.glob(os.path.join(self.save_dir, "*.parquet")))
+        if not part_paths:
+            return None
+        self.existing_schema = pq.read_schema(part_paths[0])
+
+        return self.existing_schema.names
+
+    def _write(self, data: pd.DataFrame) -> None:
+        if self.writer is None:
+            os.makedirs(self.save_dir, exist_ok=True)
+            # Appended chunks are converted to the schema of the existing part files,
+            # so that the dataset is read with the same dtypes
+            table = pa.Table.from_pandas(
+                data, schema=self.existing_schema, preserve_index=False
+            )
+            self.writer = pq.ParquetWriter(f"{self.part_path}.tmp", table.schema)
+        else:
+            # Chunks are converted to the schema of the first chunk, as columns with missing
+            # values (eg amenity counts of flats without coordinates) are inferred differently
+            table = pa.Table.from_pandas(
+                data, schema=self.writer.schema, preserve_index=False
+            )
+        self.writer.write_table(table)
+
+    def close(self, commit: bool = True) -> None:
+        if self.writer is None:
+            return
+        self.writer.close()
+        if not commit:
+            os.remove(f"{self.part_path}.tmp")
+            return
+
+        previous_parts = glob.glob(os.path.join(self.save_dir, "*.parquet"))
+        os.replace(f"{self.part_path}.tmp", self.part_path)
+        if not self.append:
+            for part_path in previous_parts:
+                os.remove(part_path)
+
+
+class PostgresDataSink(DataSink):
+    """Writes the derived hdb features into a postgres table, within one transaction
+    that is committed after the last chunk
+
+    Args:
+        db_engine (sqlalchemy.engine): Postgres database engine
+        table_name (str): name of postgres table
+    """
+
+    def __init__(self, db_engine, table_name: str, append: bool) -> None:
+        super().__init__(append)
+        self.table_name = table_name
+        self.conn = db_engine.connect()
+        self.transaction = self.conn.begin()
+
+    def _write(self, data: pd.DataFrame) -> None:
+        if self.number_of_rows == 0 and not self.append:
+            hdb_est.utils.check_duplicate_date_input(self.conn, data, self.table_name)
+        hdb_est.utils.write_data_to_sql(self.conn, data, self.table_name)
+
+    def close(self, commit: bool = True) -> None:
+        try:
+            if commit:
+                self.transaction.commit()
+            else:
+                self.transaction.rollback()
+        finally:
+            self.conn.close()
+
+
+def create_data_sink(files_config: dict, append: bool) -> DataSink:
+    """Initiates the data sink of the source the derived hdb features are saved to
+
+    Args:
+        files_config (dict): files config of the data prep pipeline
+        append (bool): whether to append to the existing data instead of replacing it
+
+    Raises:
+        NameError: Source name given was incorrect
+
+    Returns:
+        DataSink: data sink of the save_to_source
+    """
+    save_to_source = files_config["save_to_source"]
+    if save_to_source == "postgres":
+        return PostgresDataSink(
+            hdb_est.utils.create_postgres_engine(),
+            files_config["derived_features_table_name"],
+            append=append,
+        )
+    if save_to_source == "local":
+        return CSVDataSink(files_config["preprocessed_save_path"], append=append)
+    if save_to_source == "parquet":
+        return ParquetDataSink(
+            files_config["preprocessed_parquet_save_dir"], append=append
+        )
+
+    raise NameError(f"Incorrect save_to_source, '{save_to_source}' was given")
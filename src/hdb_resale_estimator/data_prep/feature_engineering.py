@@ -1,11 +1,13 @@
 """
 feature_engineering.py will contain the neccessary FeatureEngineer class to perform feature engineering
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 import os
 import pandas as pd
 from tqdm import tqdm_pandas, tqdm
+from typing import Union
 
 import hdb_resale_estimator as hdb_est
 
@@ -24,7 +26,11 @@ class FeatureEngineer:
     """
 
     def __init__(
-        self, params: dict, inference_mode: bool = False, directory=None
+        self,
+        params: dict,
+        inference_mode: bool = False,
+        directory=None,
+        date_context: str = None,
     ) -> None:
         self.month_feature = params["month"]
         self.feature_engineering_params = params["feature_engineering"]
@@ -32,6 +38,11 @@ class FeatureEngineer:
         self.year_month_feature = self.feature_engineering_params["year_month"]
         self.inference_mode = inference_mode
         self.directory = directory
+        self.date_context = date_context
+        self.flat_coordinates = None
+        self.amenity_registry = hdb_est.data_prep.amenity_registry.get_amenity_registry(
+            directory
+        )
 
     def engineer_features(self, hdb_data: pd.DataFrame, retrieve_coordinates: bool = True) -> pd.DataFrame:
         """
@@ -67,7 +78,9 @@ class FeatureEngineer:
         derived_features_hdb = pd.concat([hdb_data] + amenity_features_list, axis=1)
 
         if not self.inference_mode:
-            derived_features_hdb["date_context"] = datetime.now().strftime("%Y-%m-%d")
+            derived_features_hdb["date_context"] = (
+                self.date_context or datetime.now().strftime("%Y-%m-%d")
+            )
 
         return derived_features_hdb
 
@@ -143,37 +156,125 @@ class FeatureEngineer:
         street_name_feature = params["street_name"]
         amenities = params["amenities"]
         flat_coordinates = params["flat_coordinates"]
+        engine = params["engine"]
+        engine_params = params["engine_params"].get(engine) or {}
+        feature_store = params["feature_store"]
 
         logger.info("Generating lat long coordinates...")
         if not self.inference_mode:
-            flat_coordinates = hdb_est.utils.read_data(source=flat_coordinates["read_from_source"], params=flat_coordinates["params"])
-            hdb_coordinates = hdb_data.merge(flat_coordinates.drop_duplicates(), 
+            # The flat coordinates are read once and reused for every chunk of hdb data
+            if self.flat_coordinates is None:
+                self.flat_coordinates = hdb_est.utils.read_data(
+                    source=flat_coordinates["read_from_source"],
+                    params=flat_coordinates["params"],
+                ).drop_duplicates()
+            hdb_coordinates = hdb_data.merge(self.flat_coordinates, 
                                              how="left", 
                                              on=[block_feature, street_name_feature])[[latitude_feature, longitude_feature]]
         else:
-            hdb_coordinates = pd.DataFrame(
-                hdb_data.progress_apply(
-                    lambda x: hdb_est.utils.find_coordinates(
-                        x[block_feature] + " " + x[street_name_feature]
-                    ),
-                    axis=1,
-                ).tolist(),
-                columns=[latitude_feature, longitude_feature],
-            )
-        amenity_features_list = [hdb_coordinates]
-        for amenity in amenities:
-            logger.info(f"Getting nearest {amenity}...")
-            feature_df = self.get_nearests_amenities(
-                pd.concat([hdb_coordinates, hdb_data[self.year_month_feature]], axis=1),
-                amenity,
-                latitude_feature,
-                longitude_feature,
-                **amenities[amenity],
-            )
-            amenity_features_list.append(feature_df)
+            hdb_coordinates = self.geocode_flats(hdb_data, params)
+
+        # The amenity types are processed concurrently, and the remaining threads are
+        # shared between them to process chunks of flats concurrently
+        n_jobs = params["n_jobs"]
+        if n_jobs < 0:
+            n_jobs = max(1, os.cpu_count() + 1 + n_jobs)
+        amenity_n_jobs = max(1, n_jobs // len(amenities))
+
+        hdb_flats = pd.concat(
+            [
+                hdb_coordinates,
+                hdb_data[[block_feature, street_name_feature, self.year_month_feature]],
+            ],
+            axis=1,
+        )
+        with ThreadPoolExecutor(max_workers=min(n_jobs, len(amenities))) as executor:
+            futures = []
+            for amenity in amenities:
+                logger.info(f"Getting nearest {amenity}...")
+                futures.append(
+                    executor.submit(
+                        self.get_nearests_amenities,
+                        hdb_flats,
+                        amenity,
+                        latitude_feature,
+                        longitude_feature,
+                        engine=engine,
+                        engine_params=engine_params,
+                        block_columns=[block_feature, street_name_feature],
+                        feature_store=feature_store,
+                        n_jobs=amenity_n_jobs,
+                        **amenities[amenity],
+                    )
+                )
+            amenity_features_list = [hdb_coordinates] + [
+                future.result() for future in futures
+            ]
 
         return amenity_features_list
 
+    def geocode_flats(self, hdb_data: pd.DataFrame, params: dict) -> pd.DataFrame:
+        """Function to get the coordinates of each flat during inference. The coordinates are
+        looked up in the offline geocoder of known hdb blocks, and only retrieved from OneMap
+        (through the geocode cache) if the block is not known and remote_fallback is enabled
+
+        Args:
+            hdb_data (pd.DataFrame): Dataframe containing each hdb transaction
+            params (dict): Config params
+
+        Returns:
+            pd.DataFrame: Dataframe containing the latitude and longitude of each flat
+        """
+        latitude_feature = params["latitude"]
+        longitude_feature = params["longitude"]
+        block_feature = params["block"]
+        street_name_feature = params["street_name"]
+        offline_geocoder_params = params["offline_geocoder"]
+
+        offline_geocoder = None
+        if offline_geocoder_params["enabled"]:
+            offline_geocoder = hdb_est.geocoding.get_offline_geocoder(
+                params["flat_coordinates"],
+                block_feature=block_feature,
+                street_name_feature=street_name_feature,
+                latitude_feature=latitude_feature,
+                longitude_feature=longitude_feature,
+                fuzzy_cutoff=offline_geocoder_params["fuzzy_cutoff"],
+            )
+
+        geocode_cache_params = dict(params["geocode_cache"])
+        use_cache = geocode_cache_params.pop("enabled")
+        timeout = geocode_cache_params.pop("timeout")
+        geocode_cache = (
+            hdb_est.geocoding.get_geocode_cache(**geocode_cache_params)
+            if use_cache
+            else None
+        )
+
+        def geocode(address: str) -> tuple:
+            coordinates = offline_geocoder.geocode(address) if offline_geocoder else None
+            if coordinates is None and (
+                offline_geocoder is None or offline_geocoder_params["remote_fallback"]
+            ):
+                coordinates = hdb_est.utils.find_coordinates(
+                    address,
+                    geocode_cache=geocode_cache,
+                    use_cache=use_cache,
+                    timeout=timeout,
+                )
+
+            return coordinates or (float("inf"), float("inf"))
+
+        return pd.DataFrame(
+            [
+                geocode(f"{block} {street_name}")
+                for block, street_name in zip(
+                    hdb_data[block_feature], hdb_data[street_name_feature]
+                )
+            ],
+            columns=[latitude_feature, longitude_feature],
+        )
+
     def get_nearests_amenities(
         self,
         hdb_coordinates: pd.DataFrame,
@@ -181,72 +282,128 @@ class FeatureEngineer:
         latitude_feature: str,
         longitude_feature: str,
         amenities_data: dict,
-        radius: int,
+        radius: Union[int, list],
         period: bool,
+        engine: str,
+        engine_params: dict,
+        block_columns: list,
+        feature_store: dict,
+        n_jobs: int = 1,
+        k_nearest: int = 1,
     ) -> pd.DataFrame:
         """Function to get the following features for each flat:
-                - no_of_amenities_within_radius
+                - no_of_amenities_within_radius, for each radius
                 - distance_to_nearest_amenity
+                - distance_to_nearest_amenity_<rank>, for the 2nd to k-th nearest amenity
+                - mean_distance_to_<k>_nearest_amenity, if k_nearest is more than 1
 
         Args:
             hdb_data (pd.DataFrame): Dataframe containing each hdb transaction
             amenity (str): type of amenity (eg parks, schools, malls)
             coordinates_feature(str): name of coordinates feature
             amenities_data (dict): params to read dataframe containing the coordinates of each amenity location
-            radius (int): radius around the flat
+            radius (Union[int, list]): radius (or list of radii) around the flat
             period (bool): whether to take into account the opening date of the amenity
+            engine (str): amenity index engine used to find the nearest amenities (eg balltree, blocked, per_row)
+            engine_params (dict): params of the amenity index engine
+            block_columns (list): names of the features identifying a block (eg block, street_name)
+            feature_store (dict): params of the block amenity feature store
+            n_jobs (int, optional): number of threads used to find the nearest amenities. Defaults to 1.
+            k_nearest (int, optional): number of nearest amenities to find the distances of.
+                                       Defaults to 1.
 
         Returns:
             pd.DataFrame: Dataframe containing the amenity-specific features
         """
-        source = amenities_data["read_from_source"]
-        read_params = amenities_data["params"]
-        if self.directory:
-            data_path = read_params["data_path"]
-            read_params["data_path"] = f"{self.directory}/{data_path}"
-        amenity_details = hdb_est.utils.read_data(source=source, params=read_params)
+        radii = [radius] if isinstance(radius, (int, float)) else list(radius)
+        columns = hdb_est.data_prep.amenity_index.nearest_amenity_columns(
+            amenity, radii, k_nearest
+        )
+        if not self.inference_mode:
+            columns = columns[:-2]
+
+        # Each hdb block appears in many transactions, so the nearest amenities are only
+        # found once per unique location (and month, if the amenity opening date matters)
+        key_columns = [latitude_feature, longitude_feature]
+        block_key_columns = list(block_columns)
         if period:
-            amenity_details = amenity_details.rename(
-                columns={"Opening year": "YEAR", "Opening month": "MONTH", "Name": "address"}
-            )
-            amenity_details[self.year_month_feature] = pd.to_datetime(
-                amenity_details[["YEAR", "MONTH"]].assign(DAY=1)
-            )
-            amenity_details = amenity_details[
-                ["address", "LATITUDE", "LONGITUDE", self.year_month_feature]
+            key_columns.append(self.year_month_feature)
+            block_key_columns.append(self.year_month_feature)
+        if feature_store["enabled"]:
+            key_columns = block_key_columns + [
+                column for column in key_columns if column not in block_key_columns
             ]
+        unique_flats = hdb_coordinates.drop_duplicates(subset=key_columns).reset_index(
+            drop=True
+        )
 
+        if feature_store["enabled"]:
+            amenity_table = self.amenity_registry.get_table(amenities_data, period)
+            store = hdb_est.data_prep.feature_store.get_feature_store(
+                store_dir=feature_store["store_dir"],
+                table_name=feature_store["table_name"],
+                amenity=amenity,
+                key_columns=block_key_columns,
+                feature_columns=hdb_est.data_prep.amenity_index.nearest_amenity_columns(
+                    "amenity", radii, k_nearest
+                ),
+                fingerprint=hdb_est.data_prep.feature_store.generate_fingerprint(
+                    amenity_table.content_hash,
+                    {"radius": radii, "period": period, "k_nearest": k_nearest},
+                ),
+            )
+            stored_amenities = store.lookup(unique_flats)
+            logger.info(
+                "Found nearest %s of %s out of %s unique flats in feature store",
+                amenity,
+                len(stored_amenities),
+                len(unique_flats),
+            )
+            new_flats = unique_flats[~unique_flats.index.isin(stored_amenities.index)]
         else:
-            amenity_details = amenity_details[["address", "LATITUDE", "LONGITUDE"]]
-
-        no_of_amenities_within_radius = f"no_of_{amenity}_within_{radius}_km"
-        distance_to_nearest_amenity = f"distance_to_nearest_{amenity}"
-
-        if not self.inference_mode:
-            columns = [no_of_amenities_within_radius, distance_to_nearest_amenity]
+            stored_amenities = None
+            new_flats = unique_flats
+
+        if stored_amenities is None or len(new_flats) > 0:
+            amenity_index = self.amenity_registry.get_index(
+                engine=engine,
+                amenities_data=amenities_data,
+                period=period,
+                year_month_feature=self.year_month_feature,
+                **engine_params,
+            )
+            logger.info(
+                "Finding nearest %s for %s unique flat locations...",
+                amenity,
+                len(new_flats),
+            )
+            nearest_amenities = amenity_index.parallel_query(
+                new_flats,
+                radii=radii,
+                k_nearest=k_nearest,
+                latitude_feature=latitude_feature,
+                longitude_feature=longitude_feature,
+                n_jobs=n_jobs,
+            )
+            # The store is read-only during inference, so that requests do not rewrite the table
+            if feature_store["enabled"] and not self.inference_mode:
+                store.update(new_flats, nearest_amenities)
+            if stored_amenities is not None and len(stored_amenities) > 0:
+                nearest_amenities = pd.concat(
+                    [stored_amenities, nearest_amenities], axis=0
+                ).sort_index()
         else:
-            columns = [
-                no_of_amenities_within_radius,
-                distance_to_nearest_amenity,
-                f"nearest_{amenity}_coordinates",
-                f"nearest_{amenity}_name",
-            ]
-
-        amenity_features = pd.DataFrame(
-            hdb_coordinates.progress_apply(
-                lambda coordinates: hdb_est.utils.find_nearest_amenities(
-                    coordinates,
-                    amenity_details=amenity_details,
-                    radius=radius,
-                    period=period,
-                    latitude_feature=latitude_feature,
-                    longitude_feature=longitude_feature,
-                    year_month_feature=self.year_month_feature,
-                    return_nearest_amenity=self.inference_mode,
-                ),
-                axis=1,
-            ).tolist(),
-            columns=columns,
+            nearest_amenities = stored_amenities
+
+        nearest_amenities = hdb_coordinates[key_columns].merge(
+            pd.concat([unique_flats[key_columns], nearest_amenities], axis=1),
+            how="left",
+            on=key_columns,
+        ).drop(columns=key_columns)
+        nearest_amenities.index = hdb_coordinates.index
+        nearest_amenities.columns = hdb_est.data_prep.amenity_index.nearest_amenity_columns(
+            amenity, radii, k_nearest
         )
+        amenity_features = nearest_amenities[columns]
 
         return amenity_features
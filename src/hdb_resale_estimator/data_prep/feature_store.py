@@ -0,0 +1,254 @@
+"""
+feature_store.py will contain the BlockAmenityFeatureStore class to persist the amenity features
+of each hdb block so that they are only computed once
+"""
+import hashlib
+import json
+import logging
+import os
+import pandas as pd
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BlockAmenityFeatureStore:
+    """BlockAmenityFeatureStore class keeps the amenity features of one amenity type
+    for every hdb block (and year_month, for period amenities) in a Parquet table.
+
+    The table is invalidated whenever the fingerprint, a content hash of the amenity data
+    and the amenity config, no longer matches the one it was built with. Stores are shared
+    within a process through get_feature_store, and updates are serialized by a lock.
+
+    Args:
+        store_dir (str): directory to save the feature tables in
+        table_name (str): name of the feature table
+        amenity (str): type of amenity (eg parks, schools, malls)
+        key_columns (list): columns identifying a block (eg block, street_name, year_month)
+        feature_columns (list): nearest amenity features returned by the amenity index
+        fingerprint (str): content hash of the amenity data and config
+    """
+
+    def __init__(
+        self,
+        store_dir: str,
+        table_name: str,
+        amenity: str,
+        key_columns: list,
+        feature_columns: list,
+        fingerprint: str,
+    ) -> None:
+        self.key_columns = key_columns
+        self.feature_columns = feature_columns
+        self.fingerprint = fingerprint
+        self.table_path = os.path.join(store_dir, f"{table_name}_{amenity}.parquet")
+        self.metadata_path = os.path.join(store_dir, f"{table_name}_{amenity}.json")
+        self._table_mtime = None
+        self._lock = threading.Lock()
+        self.features = self._load()
+
+    def _load(self) -> pd.DataFrame:
+        """Loads the feature table if it was built with the same fingerprint
+
+        Returns:
+            pd.DataFrame: Dataframe containing the stored features of each block,
+            None if the table does not exist or is outdated
+        """
+        if not (
+            os.path.exists(self.table_path) and os.path.exists(self.metadata_path)
+        ):
+            return None
+
+        with open(self.metadata_path, "r") as file:
+            metadata = json.load(file)
+        if metadata["fingerprint"] != self.fingerprint:
+            logger.info(
+                "Amenity data has changed, invalidating %s...", self.table_path
+            )
+            return None
+
+        self._table_mtime = os.stat(self.table_path).st_mtime_ns
+        return pd.read_parquet(self.table_path)
+
+    def _table_changed(self) -> bool:
+        """Checks whether the feature table was saved by another process since it was loaded
+
+        Returns:
+            bool: whether the feature table has changed
+        """
+        return (
+            os.path.exists(self.table_path)
+            and os.stat(self.table_path).st_mtime_ns != self._table_mtime
+        )
+
+    def _normalize_keys(self, keys: pd.DataFrame) -> pd.DataFrame:
+        """Converts the non-datetime key columns to strings, as blocks are read as integers
+        from csv files that do not contain blocks with letters (eg 123A)
+
+        Args:
+            keys (pd.DataFrame): Dataframe containing the key columns
+
+        Returns:
+            pd.DataFrame: Dataframe containing the normalized key columns
+        """
+        return keys.astype(
+            {
+                column: str
+                for column in self.key_columns
+                if not pd.api.types.is_datetime64_any_dtype(keys[column])
+            }
+        )
+
+    def lookup(self, flats: pd.DataFrame) -> pd.DataFrame:
+        """Looks up the stored features of each flat
+
+        Args:
+            flats (pd.DataFrame): Dataframe containing the key columns of each flat
+
+        Returns:
+            pd.DataFrame: Dataframe containing the stored features of the flats whose
+            blocks are in the store, indexed by the flats index
+        """
+        features = self.features
+        if features is None:
+            return pd.DataFrame(columns=self.feature_columns)
+
+        stored_features = (
+            self._normalize_keys(flats[self.key_columns])
+            .rename_axis("flat_index")
+            .reset_index()
+            .merge(features, how="inner", on=self.key_columns)
+            .set_index("flat_index")
+            .rename_axis(flats.index.name)
+        )
+        stored_features["nearest_amenity_coordinates"] = list(
+            zip(
+                stored_features.pop("nearest_amenity_latitude"),
+                stored_features.pop("nearest_amenity_longitude"),
+            )
+        )
+
+        return stored_features[self.feature_columns]
+
+    def update(self, flats: pd.DataFrame, new_features: pd.DataFrame) -> None:
+        """Adds the features of new blocks into the store and saves the feature table.
+        Flats without a nearest amenity (eg coordinates not found) are not stored
+
+        Args:
+            flats (pd.DataFrame): Dataframe containing the key columns of the new blocks
+            new_features (pd.DataFrame): Dataframe containing the feature columns of the new blocks
+        """
+        found = new_features["nearest_amenity_name"].notna()
+        new_features = pd.concat(
+            [self._normalize_keys(flats.loc[found, self.key_columns]), new_features[found]],
+            axis=1,
+        )
+        nearest_coordinates = new_features.pop("nearest_amenity_coordinates")
+        new_features["nearest_amenity_latitude"] = [
+            coordinates[0] for coordinates in nearest_coordinates
+        ]
+        new_features["nearest_amenity_longitude"] = [
+            coordinates[1] for coordinates in nearest_coordinates
+        ]
+
+        with self._lock:
+            features = self.features
+            if self._table_changed():
+                # Blocks saved by another process since the table was loaded are kept
+                features = self._load()
+
+            if features is None:
+                features = new_features.reset_index(drop=True)
+            else:
+                features = pd.concat([features, new_features], axis=0, ignore_index=True)
+            features = features.drop_duplicates(subset=self.key_columns, keep="last")
+
+            store_dir = os.path.dirname(self.table_path)
+            os.makedirs(store_dir, exist_ok=True)
+
+            # Write to temporary files first so that concurrent readers never see a partial table
+            with tempfile.NamedTemporaryFile(
+                dir=store_dir, suffix=".parquet", delete=False
+            ) as file:
+                temp_table_path = file.name
+            features.to_parquet(temp_table_path, index=False)
+            os.replace(temp_table_path, self.table_path)
+            self._table_mtime = os.stat(self.table_path).st_mtime_ns
+
+            with tempfile.NamedTemporaryFile(
+                "w", dir=store_dir, suffix=".json", delete=False
+            ) as file:
+                json.dump({"fingerprint": self.fingerprint}, file)
+            os.replace(file.name, self.metadata_path)
+
+            self.features = features
+
+        logger.info(
+            "Saved amenity features of %s blocks to %s",
+            len(features),
+            self.table_path,
+        )
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_feature_store(
+    store_dir: str,
+    table_name: str,
+    amenity: str,
+    key_columns: list,
+    feature_columns: list,
+    fingerprint: str,
+) -> BlockAmenityFeatureStore:
+    """Gets the feature store of an amenity shared within the process, so that its feature table
+    is only read again when the fingerprint or the columns of the store have changed
+
+    Args:
+        store_dir (str): directory to save the feature tables in
+        table_name (str): name of the feature table
+        amenity (str): type of amenity (eg parks, schools, malls)
+        key_columns (list): columns identifying a block (eg block, street_name, year_month)
+        feature_columns (list): nearest amenity features returned by the amenity index
+        fingerprint (str): content hash of the amenity data and config
+
+    Returns:
+        BlockAmenityFeatureStore: shared feature store
+    """
+    table_key = (os.path.abspath(store_dir), table_name, amenity)
+    version = (fingerprint, tuple(key_columns), tuple(feature_columns))
+    with _stores_lock:
+        cached = _stores.get(table_key)
+        if cached is None or cached[0] != version:
+            cached = (
+                version,
+                BlockAmenityFeatureStore(
+                    store_dir=store_dir,
+                    table_name=table_name,
+                    amenity=amenity,
+                    key_columns=key_columns,
+                    feature_columns=feature_columns,
+                    fingerprint=fingerprint,
+                ),
+            )
+            _stores[table_key] = cached
+
+    return cached[1]
+
+
+def generate_fingerprint(content_hash: str, config: dict) -> str:
+    """Generates a fingerprint of an amenity table and its amenity config
+
+    Args:
+        content_hash (str): content hash of the amenity data
+        config (dict): amenity config used to generate the features (eg radius, period)
+
+    Returns:
+        str: fingerprint
+    """
+    fingerprint = hashlib.sha1(content_hash.encode("utf-8"))
+    fingerprint.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+
+    return fingerprint.hexdigest()
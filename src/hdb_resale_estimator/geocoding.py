@@ -0,0 +1,569 @@
+"""
+geocoding.py will contain the GeocodeCache class to persist the coordinates of each
+hdb address, so that repeat lookups do not call the OneMap API, and the OfflineGeocoder class
+to look up the coordinates of known hdb blocks without calling the OneMap API, and the OneMapClient
+class to search the OneMap API concurrently
+"""
+from concurrent.futures import ThreadPoolExecutor
+import difflib
+import json
+import logging
+import os
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+import sqlite3
+import threading
+import time
+from tqdm import tqdm
+
+import hdb_resale_estimator as hdb_est
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "data/geocode_cache/geocodes.sqlite"
+ONEMAP_SEARCH_URL = "https://www.onemap.gov.sg/api/common/elastic/search"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Inference and input validation wait on each lookup, so a failed request is not retried
+INFERENCE_TIMEOUT = 3
+
+# Street names are abbreviated in the hdb resale data, so user inputs are abbreviated the same way
+STREET_ABBREVIATIONS = {
+    "AVENUE": "AVE",
+    "BUKIT": "BT",
+    "CENTRAL": "CTRL",
+    "CENTRE": "CTR",
+    "CLOSE": "CL",
+    "COMMONWEALTH": "C'WEALTH",
+    "CRESCENT": "CRES",
+    "DRIVE": "DR",
+    "GARDENS": "GDNS",
+    "HEIGHTS": "HTS",
+    "JALAN": "JLN",
+    "KAMPONG": "KG",
+    "LORONG": "LOR",
+    "MARKET": "MKT",
+    "NORTH": "NTH",
+    "PARK": "PK",
+    "PLACE": "PL",
+    "ROAD": "RD",
+    "SOUTH": "STH",
+    "STREET": "ST",
+    "TANJONG": "TG",
+    "TERRACE": "TER",
+    "UPPER": "UPP",
+}
+
+
+class GeocodeCache:
+    """GeocodeCache class keeps the coordinates of each address in a SQLite table, keyed by
+    the normalized "block street" string. Addresses that were not found are also cached
+    (as infinite coordinates) with a shorter TTL, and the least recently updated entries
+    are evicted once the cache exceeds max_entries.
+
+    Entries are also kept in memory, so repeat lookups within a process do not query SQLite.
+
+    Args:
+        cache_path (str, optional): file path of the SQLite cache. Defaults to DEFAULT_CACHE_PATH.
+        ttl_days (float, optional): number of days before a found address expires. Defaults to 90.
+        negative_ttl_days (float, optional): number of days before an address that was not found
+                                             expires. Defaults to 1.
+        max_entries (int, optional): maximum number of cached addresses. Defaults to 100000.
+    """
+
+    def __init__(
+        self,
+        cache_path: str = DEFAULT_CACHE_PATH,
+        ttl_days: float = 90,
+        negative_ttl_days: float = 1,
+        max_entries: int = 100000,
+    ) -> None:
+        self.cache_path = cache_path
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.negative_ttl = negative_ttl_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._connection = sqlite3.connect(
+            cache_path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS geocodes (
+                address TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS geocodes_updated_at ON geocodes (updated_at)"
+        )
+
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        """Normalizes an address so that differently formatted inputs share one entry
+
+        Args:
+            address (str): block number and street name
+
+        Returns:
+            str: upper case address with single spaces
+        """
+        return " ".join(str(address).upper().split())
+
+    def _read(self, address: str) -> tuple:
+        """Reads the cached entry of a normalized address
+
+        Args:
+            address (str): normalized address
+
+        Returns:
+            tuple: latitude, longitude and update time, None if the address is not cached
+        """
+        entry = self._entries.get(address)
+        if entry is None:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT latitude, longitude, updated_at FROM geocodes WHERE address = ?",
+                    (address,),
+                ).fetchone()
+            if row is None:
+                return None
+            latitude, longitude, updated_at = row
+            entry = (
+                float("inf") if latitude is None else latitude,
+                float("inf") if longitude is None else longitude,
+                updated_at,
+            )
+            self._entries[address] = entry
+
+        return entry
+
+    def get(self, address: str, allow_expired: bool = False) -> tuple:
+        """Gets the cached coordinates of an address
+
+        Args:
+            address (str): block number and street name
+            allow_expired (bool, optional): whether to return entries past their TTL,
+                                            eg when OneMap is unreachable. Defaults to False.
+
+        Returns:
+            tuple: latitude and longitude coordinates, None if the address is not cached or expired
+        """
+        entry = self._read(self.normalize_address(address))
+        if entry is None:
+            return None
+
+        latitude, longitude, updated_at = entry
+        ttl = self.ttl if latitude != float("inf") else self.negative_ttl
+        if not allow_expired and time.time() - updated_at > ttl:
+            return None
+
+        return latitude, longitude
+
+    def set(self, address: str, latitude: float, longitude: float) -> None:
+        """Caches the coordinates of an address, evicting the least recently updated
+        entries if the cache is full
+
+        Args:
+            address (str): block number and street name
+            latitude (float): latitude of the address, inf if not found
+            longitude (float): longitude of the address, inf if not found
+        """
+        address = self.normalize_address(address)
+        updated_at = time.time()
+        found = latitude != float("inf")
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)",
+                (
+                    address,
+                    latitude if found else None,
+                    longitude if found else None,
+                    updated_at,
+                ),
+            )
+            (no_of_entries,) = self._connection.execute(
+                "SELECT COUNT(*) FROM geocodes"
+            ).fetchone()
+            if no_of_entries > self.max_entries:
+                evicted = self._connection.execute(
+                    "SELECT address FROM geocodes ORDER BY updated_at LIMIT ?",
+                    (no_of_entries - self.max_entries,),
+                ).fetchall()
+                self._connection.executemany(
+                    "DELETE FROM geocodes WHERE address = ?", evicted
+                )
+                for (evicted_address,) in evicted:
+                    self._entries.pop(evicted_address, None)
+        self._entries[address] = (latitude, longitude, updated_at)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_geocode_cache(
+    cache_path: str = DEFAULT_CACHE_PATH,
+    ttl_days: float = 90,
+    negative_ttl_days: float = 1,
+    max_entries: int = 100000,
+) -> GeocodeCache:
+    """Gets the geocode cache of a file path and params shared within the process
+
+    Args:
+        cache_path (str, optional): file path of the SQLite cache. Defaults to DEFAULT_CACHE_PATH.
+        ttl_days (float, optional): number of days before a found address expires. Defaults to 90.
+        negative_ttl_days (float, optional): number of days before an address that was not found
+                                             expires. Defaults to 1.
+        max_entries (int, optional): maximum number of cached addresses. Defaults to 100000.
+
+    Returns:
+        GeocodeCache: shared geocode cache
+    """
+    key = (cache_path, ttl_days, negative_ttl_days, max_entries)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = GeocodeCache(
+                cache_path=cache_path,
+                ttl_days=ttl_days,
+                negative_ttl_days=negative_ttl_days,
+                max_entries=max_entries,
+            )
+
+        return _caches[key]
+
+
+class OfflineGeocoder:
+    """OfflineGeocoder class answers coordinate lookups in memory from the coordinates of
+    known hdb blocks (eg flat_coordinates.csv). Addresses are first looked up in an exact index
+    on the normalized block and street name, and otherwise matched to the closest street name
+    of the same block, to allow for street name variants (eg "BEDOK NORTH AVENUE 1").
+
+    Args:
+        flat_coordinates (pd.DataFrame): block, street name and coordinates of each hdb block
+        block_feature (str): name of block feature
+        street_name_feature (str): name of street name feature
+        latitude_feature (str): name of latitude feature
+        longitude_feature (str): name of longitude feature
+        fuzzy_cutoff (float, optional): minimum similarity (between 0 and 1) of a fuzzy street name
+                                        match. Defaults to 0.85.
+    """
+
+    def __init__(
+        self,
+        flat_coordinates: pd.DataFrame,
+        block_feature: str,
+        street_name_feature: str,
+        latitude_feature: str,
+        longitude_feature: str,
+        fuzzy_cutoff: float = 0.85,
+    ) -> None:
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._index = {}
+        self._streets_by_block = {}
+        for block, street_name, latitude, longitude in flat_coordinates[
+            [block_feature, street_name_feature, latitude_feature, longitude_feature]
+        ].itertuples(index=False):
+            block = self.normalize_block(block)
+            street_name = self.normalize_street_name(street_name)
+            coordinates = (float(latitude), float(longitude))
+            self._index.setdefault(f"{block} {street_name}", coordinates)
+            self._streets_by_block.setdefault(block, {}).setdefault(
+                street_name, coordinates
+            )
+
+    @staticmethod
+    def normalize_block(block: str) -> str:
+        """Normalizes a block number (eg "123a" to "123A")
+
+        Args:
+            block (str): block number
+
+        Returns:
+            str: upper case block number without spaces
+        """
+        return "".join(str(block).upper().split())
+
+    @staticmethod
+    def normalize_street_name(street_name: str) -> str:
+        """Normalizes a street name, abbreviating its words the same way as the hdb resale data
+
+        Args:
+            street_name (str): street name
+
+        Returns:
+            str: upper case and abbreviated street name with single spaces
+        """
+        return " ".join(
+            STREET_ABBREVIATIONS.get(word, word) for word in str(street_name).upper().split()
+        )
+
+    def geocode(self, address: str) -> tuple:
+        """Gets the coordinates of an address
+
+        Args:
+            address (str): block number and street name
+
+        Returns:
+            tuple: latitude and longitude coordinates, None if the address is not a known hdb block
+        """
+        block, _, street_name = str(address).strip().partition(" ")
+        block = self.normalize_block(block)
+        street_name = self.normalize_street_name(street_name)
+
+        coordinates = self._index.get(f"{block} {street_name}")
+        if coordinates is None and block in self._streets_by_block:
+            streets = self._streets_by_block[block]
+            matches = difflib.get_close_matches(
+                street_name, streets.keys(), n=1, cutoff=self.fuzzy_cutoff
+            )
+            if matches:
+                coordinates = streets[matches[0]]
+
+        return coordinates
+
+
+_geocoders = {}
+_geocoders_lock = threading.Lock()
+
+
+def get_offline_geocoder(
+    flat_coordinates: dict,
+    block_feature: str,
+    street_name_feature: str,
+    latitude_feature: str,
+    longitude_feature: str,
+    fuzzy_cutoff: float = 0.85,
+) -> OfflineGeocoder:
+    """Gets the offline geocoder of the hdb block coordinates shared within the process
+
+    Args:
+        flat_coordinates (dict): params to read dataframe containing the coordinates of each hdb block
+        block_feature (str): name of block feature
+        street_name_feature (str): name of street name feature
+        latitude_feature (str): name of latitude feature
+        longitude_feature (str): name of longitude feature
+        fuzzy_cutoff (float, optional): minimum similarity (between 0 and 1) of a fuzzy street name
+                                        match. Defaults to 0.85.
+
+    Returns:
+        OfflineGeocoder: shared offline geocoder
+    """
+    key = json.dumps(
+        [
+            flat_coordinates["read_from_source"],
+            dict(flat_coordinates["params"]),
+            block_feature,
+            street_name_feature,
+            latitude_feature,
+            longitude_feature,
+            fuzzy_cutoff,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    with _geocoders_lock:
+        if key not in _geocoders:
+            logger.info("Indexing hdb block coordinates for offline geocoding...")
+            _geocoders[key] = OfflineGeocoder(
+                hdb_est.utils.read_data(
+                    source=flat_coordinates["read_from_source"],
+                    params=flat_coordinates["params"],
+                ),
+                block_feature=block_feature,
+                street_name_feature=street_name_feature,
+                latitude_feature=latitude_feature,
+                longitude_feature=longitude_feature,
+                fuzzy_cutoff=fuzzy_cutoff,
+            )
+
+        return _geocoders[key]
+
+
+class TokenBucket:
+    """TokenBucket class limits the rate of requests shared between threads. Tokens are added
+    at a constant rate up to the capacity, and each request waits until it can take one token.
+
+    Args:
+        rate (float): number of tokens added per second
+        capacity (float, optional): maximum number of tokens, ie the burst size. Defaults to rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Waits until a token is available and takes it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class OneMapClient:
+    """OneMapClient class searches the OneMap API for the first result of each search value,
+    reusing pooled connections of one session. Bulk searches run on a thread pool, with the rate
+    of requests limited by a token bucket, and failed requests are retried with exponential backoff.
+
+    Args:
+        base_url (str, optional): URL of the OneMap search API. Defaults to ONEMAP_SEARCH_URL.
+        max_workers (int, optional): number of concurrent requests. Defaults to 8.
+        requests_per_second (float, optional): maximum rate of requests, None for no limit.
+                                               Defaults to 4.
+        max_retries (int, optional): number of retries of a failed request. Defaults to 3.
+        backoff_factor (float, optional): seconds to wait before the first retry, doubled for
+                                          each subsequent retry. Defaults to 0.5.
+        timeout (float, optional): timeout of each request in seconds. Defaults to 10.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ONEMAP_SEARCH_URL,
+        max_workers: int = 8,
+        requests_per_second: float = 4,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 10,
+    ) -> None:
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.rate_limiter = (
+            TokenBucket(requests_per_second) if requests_per_second else None
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, search_value: str, timeout: float = None) -> dict:
+        """Searches the OneMap API
+
+        Args:
+            search_value (str): value to search (eg block number and street name, amenity name)
+            timeout (float, optional): timeout of each request in seconds. Defaults to None,
+                                       which uses the timeout of the client.
+
+        Raises:
+            requests.RequestException: Request still failed after all retries
+
+        Returns:
+            dict: first search result, None if there are no results
+        """
+        params = {
+            "searchVal": search_value,
+            "returnGeom": "Y",
+            "getAddrDetails": "Y",
+            "pageNum": 1,
+        }
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(
+                    self.base_url, params=params, timeout=timeout or self.timeout
+                )
+                response.raise_for_status()
+                results = response.json()["results"]
+                return results[0] if len(results) != 0 else None
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as error:
+                retry = not isinstance(error, requests.HTTPError) or (
+                    error.response.status_code in RETRY_STATUS_CODES
+                )
+                if not retry or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_factor * 2**attempt)
+
+    def search_many(self, search_values: list) -> pd.DataFrame:
+        """Searches the OneMap API for every search value concurrently
+
+        Args:
+            search_values (list): values to search (eg amenity names)
+
+        Returns:
+            pd.DataFrame: Dataframe containing the first search result of each search value that
+            was found, with the search value in the address column
+        """
+        search_values = list(search_values)
+
+        def search(search_value: str) -> dict:
+            try:
+                return self.search(search_value)
+            except (requests.RequestException, ValueError) as error:
+                logger.warning(f"Unable to search OneMap for {search_value}: {error}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(
+                tqdm(executor.map(search, search_values), total=len(search_values))
+            )
+
+        found_results = [
+            dict(result, address=search_value)
+            for search_value, result in zip(search_values, results)
+            if result is not None
+        ]
+        logger.info(
+            f"Found coordinates for {len(found_results)} out of {len(search_values)} search values"
+        )
+
+        return pd.DataFrame(found_results)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_onemap_client(base_url: str = ONEMAP_SEARCH_URL, **params) -> OneMapClient:
+    """Gets the OneMap client of a base url and params shared within the process
+
+    Args:
+        base_url (str, optional): URL of the OneMap search API. Defaults to ONEMAP_SEARCH_URL.
+        **params: other OneMapClient params (eg max_workers, requests_per_second, max_retries)
+
+    Returns:
+        OneMapClient: shared OneMap client
+    """
+    key = json.dumps([base_url, params], sort_keys=True)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = OneMapClient(base_url=base_url, **params)
+
+        return _clients[key]
+
+
+def get_inference_onemap_client(
+    base_url: str = ONEMAP_SEARCH_URL, timeout: float = INFERENCE_TIMEOUT
+) -> OneMapClient:
+    """Gets the OneMap client used during inference and input validation shared within the process.
+    Failed requests are not retried and time out quickly, so that a single lookup does not block
+    for long when OneMap is slow or unreachable
+
+    Args:
+        base_url (str, optional): URL of the OneMap search API. Defaults to ONEMAP_SEARCH_URL.
+        timeout (float, optional): timeout of each request in seconds. Defaults to INFERENCE_TIMEOUT.
+
+    Returns:
+        OneMapClient: shared OneMap client without retries
+    """
+    return get_onemap_client(base_url=base_url, max_retries=0, timeout=timeout)
@@ -1,5 +1,7 @@
 from . import builder
+from . import dataset_cache
 from . import training
+from . import tuning
 from . import train_test_split
 from . import model
 from . import evaluation
\ No newline at end of file
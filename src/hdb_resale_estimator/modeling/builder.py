@@ -4,7 +4,9 @@ to load a model and prepare the data for training or inference
 from abc import ABC, abstractmethod
 from interpret.glassbox import ExplainableBoostingRegressor
 import logging
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import OrdinalEncoder, OneHotEncoder, StandardScaler
 from xgboost import XGBRegressor
@@ -14,6 +16,9 @@ import hdb_resale_estimator as hdb_est
 logger = logging.getLogger(__name__)
 logger.setLevel(10)
 
+# Models that are fitted on scipy sparse matrices without densifying them
+SPARSE_INPUT_MODELS = ["xgboost"]
+
 
 class Builder(ABC):
     """Builder class, not to be imported directly."""
@@ -21,6 +26,7 @@ class Builder(ABC):
     @abstractmethod
     def __init__(self):
         self.model = None
+        self.model_name = None
         self.objects = {}
 
     def process_inference_data(self, inference_data: pd.DataFrame) -> pd.DataFrame:
@@ -43,7 +49,10 @@ class Builder(ABC):
             columns = self.objects["one_hot_encoder"]["columns"]
             fitted_encoder = self.objects["one_hot_encoder"]["encoder"]
             inference_data = self._one_hot_encode_cat_var(
-                inference_data, columns, fitted_encoder=fitted_encoder
+                inference_data,
+                columns,
+                fitted_encoder=fitted_encoder,
+                sparse_output=self.objects["one_hot_encoder"].get("sparse", False),
             )
         if "standard_scaler" in self.objects:
             scaler = self.objects["standard_scaler"]["scaler"]
@@ -51,6 +60,112 @@ class Builder(ABC):
 
         return inference_data
 
+    def compile_inference_layout(self) -> "InferenceLayout":
+        """Compiles the fitted encoders and scaler into the column layout of the processed
+        features, which is used to process single inference rows
+
+        Returns:
+            InferenceLayout: column layout of the processed features
+        """
+        self._inference_layout = InferenceLayout(self)
+
+        return self._inference_layout
+
+    def process_inference_dict(self, feature_dict: dict, as_frame: bool = False):
+        """Performs encoding and scaling of a single inference row, written directly into a
+        row vector through the compiled column layout instead of the pandas and sklearn
+        transforms of process_inference_data
+
+        Args:
+            feature_dict (dict): Inference derived features of a hdb flat
+            as_frame (bool, optional): Whether to return the row as a dataframe with the
+            processed feature names. Defaults to False.
+
+        Returns:
+            Union[np.ndarray, pd.DataFrame]: processed features of shape (1, features)
+        """
+        layout = getattr(self, "_inference_layout", None) or self.compile_inference_layout()
+        row = layout.transform(feature_dict)
+        if as_frame:
+            return pd.DataFrame(row, columns=layout.columns)
+
+        return row
+
+    def predict_inference_dict(self, feature_dict: dict) -> float:
+        """Predicts the target label of a single inference row
+
+        Args:
+            feature_dict (dict): Inference derived features of a hdb flat
+
+        Returns:
+            float: predicted target label
+        """
+        if isinstance(self.model, XGBRegressor):
+            # The row follows the column layout the model was fitted on
+            prediction = self.model.predict(
+                self.process_inference_dict(feature_dict), validate_features=False
+            )
+        else:
+            prediction = self.model.predict(
+                self.process_inference_dict(feature_dict, as_frame=True)
+            )
+
+        return float(prediction[0])
+
+    def model_input(self, feature_data: pd.DataFrame):
+        """Converts the processed features into the input of the model. When the one-hot
+        encoded features are kept sparse, the features are passed to models that support sparse
+        input (XGBoost) as a CSR matrix in the same column order, and densified for the other models
+
+        Args:
+            feature_data (pd.DataFrame): Dataframe containing processed features
+
+        Returns:
+            Union[pd.DataFrame, sparse.csr_matrix]: features to fit or predict the model on
+        """
+        if not isinstance(feature_data, pd.DataFrame) or not self.objects.get(
+            "one_hot_encoder", {}
+        ).get("sparse", False):
+            return feature_data
+
+        is_sparse = np.array(
+            [isinstance(dtype, pd.SparseDtype) for dtype in feature_data.dtypes]
+        )
+        if self.model_name not in SPARSE_INPUT_MODELS:
+            return feature_data.assign(
+                **{
+                    column: feature_data[column].sparse.to_dense()
+                    for column in feature_data.columns[is_sparse]
+                }
+            )
+
+        dense_positions = np.flatnonzero(~is_sparse)
+        sparse_positions = np.flatnonzero(is_sparse)
+        blocks = []
+        if len(dense_positions):
+            # Zeros of the dense features are stored explicitly, as entries which are not
+            # stored are treated as missing values by XGBoost
+            dense_values = feature_data.iloc[:, dense_positions].to_numpy(dtype=float)
+            number_of_rows, number_of_columns = dense_values.shape
+            blocks.append(
+                sparse.csr_matrix(
+                    (
+                        dense_values.ravel(),
+                        np.tile(np.arange(number_of_columns, dtype=np.int32), number_of_rows),
+                        np.arange(0, dense_values.size + 1, number_of_columns),
+                    ),
+                    shape=dense_values.shape,
+                )
+            )
+        if len(sparse_positions):
+            blocks.append(feature_data.iloc[:, sparse_positions].sparse.to_coo())
+        feature_matrix = sparse.hstack(blocks, format="csr")
+
+        # Restores the column order of the dataframe
+        column_order = np.argsort(np.concatenate([dense_positions, sparse_positions]))
+
+        return feature_matrix[:, column_order]
+
     def _ordinal_encode_variables(
         self,
         feature_data: pd.DataFrame,
@@ -103,6 +218,7 @@ class Builder(ABC):
         feature_data: pd.DataFrame,
         columns: list = None,
         fitted_encoder: OneHotEncoder = None,
+        sparse_output: bool = False,
     ) -> pd.DataFrame:
         """Performs one-hot encoding for single label categorical features before training or inference
 
@@ -112,6 +228,8 @@ class Builder(ABC):
             Defaults to None during training
             fitted_encoder (OneHotEncoder): Encoder object to be used during inference.
             Defaults to None during training
+            sparse_output (bool): Whether to keep the one-hot encoded features as sparse columns
+            instead of dense float64 columns. Defaults to False
 
         Returns:
             pd.DataFrame: pd.DataFrame with one-hot encoded features
@@ -131,23 +249,29 @@ class Builder(ABC):
 
         if fitted_encoder:
             encoder = fitted_encoder
-            ohc_table = pd.DataFrame(
-                encoder.transform(table_to_encode).toarray(),
+            encoded_matrix = encoder.transform(table_to_encode)
+
+        else:
+            encoder = OneHotEncoder()
+            encoded_matrix = encoder.fit_transform(table_to_encode)
+            self.objects["one_hot_encoder"] = {
+                "columns": existing_columns,
+                "encoder": encoder,
+                "sparse": sparse_output,
+            }
+
+        if sparse_output:
+            ohc_table = pd.DataFrame.sparse.from_spmatrix(
+                encoded_matrix,
                 columns=encoder.get_feature_names_out(table_to_encode.columns),
                 index=table_to_encode.index,
             )
-
         else:
-            encoder = OneHotEncoder()
             ohc_table = pd.DataFrame(
-                encoder.fit_transform(table_to_encode).toarray(),
+                encoded_matrix.toarray(),
                 columns=encoder.get_feature_names_out(table_to_encode.columns),
                 index=table_to_encode.index,
             )
-            self.objects["one_hot_encoder"] = {
-                "columns": existing_columns,
-                "encoder": encoder,
-            }
 
         feature_data = feature_data.join(ohc_table)
 
@@ -238,6 +362,7 @@ class ClassicalModelBuilder(Builder):
             ClassicalModelBuilder: SklearnBuilder object with model params set
         """
 
+        self.model_name = model_name
         if model_name == "ebm":
             self.model = ExplainableBoostingRegressor().set_params(**model_params)
 
@@ -251,3 +376,122 @@ class ClassicalModelBuilder(Builder):
             raise NameError(f"Incorrect model name, '{model_name}' was given")
 
         return self
+
+
+class InferenceLayout:
+    """InferenceLayout class holds the column layout of the processed features of a builder,
+    with the position of each numerical feature and lookup dicts from each category to its
+    ordinal code or one-hot position, so that a single inference row is processed with a few
+    dict lookups into a copy of a preallocated row
+
+    Args:
+        builder (Builder): builder with the fitted encoders and scaler
+    """
+
+    def __init__(self, builder: Builder) -> None:
+        features = list(builder.objects["features"])
+        columns = list(features)
+        ordinal_columns, one_hot_columns, one_hot_names = [], [], []
+
+        if "ordinal_encoder" in builder.objects:
+            ordinal_encoder = builder.objects["ordinal_encoder"]["encoder"]
+            ordinal_columns = list(builder.objects["ordinal_encoder"]["columns"])
+            columns = [column for column in columns if column not in ordinal_columns]
+            columns += list(ordinal_encoder.get_feature_names_out(ordinal_columns))
+
+        sparse_one_hot = False
+        if "one_hot_encoder" in builder.objects:
+            one_hot_encoder = builder.objects["one_hot_encoder"]["encoder"]
+            one_hot_columns = list(builder.objects["one_hot_encoder"]["columns"])
+            one_hot_names = list(one_hot_encoder.get_feature_names_out(one_hot_columns))
+            columns = [column for column in columns if column not in one_hot_columns]
+            columns += one_hot_names
+            sparse_one_hot = builder.objects["one_hot_encoder"].get("sparse", False)
+
+        self.mean, self.scale = None, None
+        if "standard_scaler" in builder.objects:
+            scaler = builder.objects["standard_scaler"]["scaler"]
+            columns = sorted(columns)
+            self.mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(len(columns))
+            self.scale = scaler.scale_ if scaler.scale_ is not None else np.ones(len(columns))
+
+        self.columns = columns
+        positions = {column: position for position, column in enumerate(columns)}
+
+        self.numerical_positions = [
+            (feature, positions[feature])
+            for feature in features
+            if feature not in ordinal_columns and feature not in one_hot_columns
+        ]
+        self.ordinal_codes = [
+            (
+                feature,
+                positions[feature],
+                {category: float(code) for code, category in enumerate(categories)},
+            )
+            for feature, categories in zip(
+                ordinal_columns,
+                ordinal_encoder.categories_ if ordinal_columns else [],
+            )
+        ]
+
+        self.one_hot_positions = []
+        offset = 0
+        for feature, categories in zip(
+            one_hot_columns, one_hot_encoder.categories_ if one_hot_columns else []
+        ):
+            self.one_hot_positions.append(
+                (
+                    feature,
+                    {
+                        category: positions[one_hot_names[offset + index]]
+                        for index, category in enumerate(categories)
+                    },
+                )
+            )
+            offset += len(categories)
+
+        # XGBoost and random forests predict on float32 features, EBM on float64 features
+        self.dtype = (
+            np.float32
+            if isinstance(builder.model, (XGBRegressor, RandomForestRegressor))
+            else np.float64
+        )
+        self.template = np.zeros(len(columns))
+        if sparse_one_hot and isinstance(builder.model, XGBRegressor):
+            # One-hot entries which are not set were not stored in the sparse training features,
+            # and are treated as missing values by XGBoost
+            for _, category_positions in self.one_hot_positions:
+                self.template[list(category_positions.values())] = np.nan
+
+    def transform(self, feature_dict: dict) -> np.ndarray:
+        """Writes the features of a single inference row into a row vector
+
+        Args:
+            feature_dict (dict): Inference derived features of a hdb flat
+
+        Raises:
+            ValueError: Category of a categorical feature was not seen during training
+
+        Returns:
+            np.ndarray: processed features of shape (1, features)
+        """
+        row = self.template.copy()
+        for feature, position in self.numerical_positions:
+            value = feature_dict[feature]
+            row[position] = np.nan if value is None else value
+
+        try:
+            for feature, position, codes in self.ordinal_codes:
+                row[position] = codes[feature_dict[feature]]
+            for feature, category_positions in self.one_hot_positions:
+                row[category_positions[feature_dict[feature]]] = 1.0
+        except KeyError as unknown_category:
+            raise ValueError(
+                f"Found unknown category {unknown_category} in feature {feature}"
+            ) from unknown_category
+
+        if self.mean is not None:
+            row = (row - self.mean) / self.scale
+
+        return row.astype(self.dtype).reshape(1, -1)
@@ -0,0 +1,252 @@
+"""
+dataset_cache.py will contain the DatasetCache class to persist the encoded, split and scaled
+datasets of the train pipeline, so that they are only processed once for every trial of a sweep
+"""
+import hashlib
+import joblib
+import json
+import logging
+import numpy as np
+from omegaconf import OmegaConf
+import os
+import pandas as pd
+import pyarrow as pa
+from pyarrow import parquet as pq
+from scipy import sparse
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Version of the layout of the saved files, so that datasets saved in a previous layout are not read
+DATASET_CACHE_VERSION = 2
+
+
+class DatasetCache:
+    """DatasetCache class keeps the processed datasets of the train pipeline, together with the
+    builder objects (encoders, scaler) fitted on them, in one directory per fingerprint.
+
+    The numeric dense features of each dataset are saved as one uncompressed array per dtype, with
+    a row per feature, and the labels and index as uncompressed arrays. These are loaded as read-only
+    memory maps without copying, so that the processes loading the same datasets (eg the workers
+    of a sweep) share them through the page cache. Other dense features are saved as a Parquet
+    table and sparse one-hot encoded features as a CSR matrix, which are read into memory.
+    The directory is written under a temporary name and renamed once complete, so that trials
+    running in parallel never read a partially written directory.
+
+    Args:
+        cache_dir (str): directory to save the processed datasets in
+        fingerprint (str): hash of the data version and the config used to process the datasets
+    """
+
+    def __init__(self, cache_dir: str, fingerprint: str) -> None:
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.dataset_dir = os.path.join(cache_dir, fingerprint)
+        self.metadata_path = os.path.join(self.dataset_dir, "metadata.json")
+
+    def exists(self) -> bool:
+        """Checks whether the processed datasets were saved with the same fingerprint
+
+        Returns:
+            bool: whether the processed datasets were saved
+        """
+        return self._read_metadata() is not None
+
+    def _read_metadata(self) -> dict:
+        """Reads the metadata of the processed datasets
+
+        Returns:
+            dict: metadata of the processed datasets, None if they were not saved
+            with the same fingerprint
+        """
+        if not os.path.exists(self.metadata_path):
+            return None
+
+        with open(self.metadata_path, "r") as file:
+            metadata = json.load(file)
+        if metadata["fingerprint"] != self.fingerprint:
+            return None
+
+        return metadata
+
+    def load(self) -> tuple:
+        """Loads the processed datasets if they were saved with the same fingerprint
+
+        Returns:
+            tuple: Dictionary containing the processed datasets, the fitted builder objects and
+            the list of processed features, None if the datasets were not saved
+        """
+        metadata = self._read_metadata()
+        if metadata is None:
+            return None
+
+        datasets = {}
+        for split, split_metadata in metadata["splits"].items():
+            index = pd.Index(
+                self._load_array(f"{split}_index.npy"), name=split_metadata["index_name"]
+            )
+            features = {}
+            for file_name, columns in split_metadata["arrays"].items():
+                array = self._load_array(file_name)
+                features.update(zip(columns, array))
+            if split_metadata["table_columns"]:
+                table = pq.read_table(
+                    os.path.join(self.dataset_dir, f"{split}_X.parquet")
+                ).to_pandas()
+                features.update(
+                    (column, table[column].array)
+                    for column in split_metadata["table_columns"]
+                )
+            if split_metadata["sparse_columns"]:
+                sparse_features = pd.DataFrame.sparse.from_spmatrix(
+                    sparse.load_npz(
+                        os.path.join(self.dataset_dir, f"{split}_X_sparse.npz")
+                    ),
+                    columns=split_metadata["sparse_columns"],
+                )
+                features.update(
+                    (column, sparse_features[column].array)
+                    for column in split_metadata["sparse_columns"]
+                )
+
+            # Built from the arrays without copy, so that the memory mapped arrays are not read
+            datasets[split] = {
+                "X": pd.DataFrame(
+                    {column: features[column] for column in split_metadata["columns"]},
+                    index=index,
+                    copy=False,
+                ),
+                "y": pd.Series(
+                    self._load_array(f"{split}_y.npy"),
+                    index=index,
+                    name=split_metadata["label"],
+                    copy=False,
+                ),
+            }
+
+        objects = joblib.load(os.path.join(self.dataset_dir, "objects.joblib"))
+
+        return datasets, objects, metadata["features"]
+
+    def _load_array(self, file_name: str) -> np.ndarray:
+        """Loads a saved array as a read-only memory map
+
+        Args:
+            file_name (str): file name of the array in the dataset directory
+
+        Returns:
+            np.ndarray: memory mapped array
+        """
+        return np.load(os.path.join(self.dataset_dir, file_name), mmap_mode="r")
+
+    def save(self, datasets: dict, objects: dict, features: list) -> None:
+        """Saves the processed datasets, unless they were already saved by another trial
+
+        Args:
+            datasets (dict): Dictionary containing the processed datasets
+            objects (dict): builder objects (encoders, scaler) fitted on the datasets
+            features (list): list of processed features
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        metadata = {"fingerprint": self.fingerprint, "features": features, "splits": {}}
+        try:
+            for split, dataset in datasets.items():
+                arrays, table_columns, sparse_columns = {}, [], []
+                for column, dtype in dataset["X"].dtypes.items():
+                    if isinstance(dtype, pd.SparseDtype):
+                        sparse_columns.append(column)
+                    elif isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+                        arrays.setdefault(f"{split}_X_{dtype.name}.npy", []).append(column)
+                    else:
+                        table_columns.append(column)
+
+                # Each feature is a contiguous row of the array of its dtype
+                for file_name, columns in arrays.items():
+                    np.save(
+                        os.path.join(tmp_dir, file_name),
+                        np.stack([dataset["X"][column].to_numpy() for column in columns]),
+                    )
+                if table_columns:
+                    pq.write_table(
+                        pa.Table.from_pandas(
+                            dataset["X"][table_columns], preserve_index=False
+                        ),
+                        os.path.join(tmp_dir, f"{split}_X.parquet"),
+                    )
+                if sparse_columns:
+                    sparse.save_npz(
+                        os.path.join(tmp_dir, f"{split}_X_sparse.npz"),
+                        dataset["X"][sparse_columns].sparse.to_coo().tocsr(),
+                        compressed=False,
+                    )
+                np.save(
+                    os.path.join(tmp_dir, f"{split}_index.npy"),
+                    dataset["X"].index.to_numpy(),
+                )
+                np.save(os.path.join(tmp_dir, f"{split}_y.npy"), dataset["y"].to_numpy())
+                metadata["splits"][split] = {
+                    "columns": list(dataset["X"].columns),
+                    "arrays": arrays,
+                    "table_columns": table_columns,
+                    "sparse_columns": sparse_columns,
+                    "index_name": dataset["X"].index.name,
+                    "label": dataset["y"].name,
+                }
+
+            joblib.dump(objects, os.path.join(tmp_dir, "objects.joblib"))
+            with open(os.path.join(tmp_dir, "metadata.json"), "w") as file:
+                json.dump(metadata, file)
+
+            os.rename(tmp_dir, self.dataset_dir)
+            logger.info("Saved processed datasets to %s", self.dataset_dir)
+        except OSError as save_error:
+            # The rename fails when another trial saved the same datasets first
+            if not os.path.exists(self.metadata_path):
+                logger.warning(
+                    "Failed to save processed datasets to %s: %s",
+                    self.dataset_dir,
+                    save_error,
+                )
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def generate_dataset_fingerprint(
+    data_version: str,
+    columns: list,
+    label_column: str,
+    process_config: dict,
+    model_config: dict,
+) -> str:
+    """Generates the fingerprint of the processed datasets, from the version of the derived features
+    and the config used to encode, split and scale them
+
+    Args:
+        data_version (str): version of the derived features
+        columns (list): columns of the derived features
+        label_column (str): name of the label column
+        process_config (dict): process_train_data config of the train pipeline
+        model_config (dict): config of the chosen model
+
+    Returns:
+        str: fingerprint of the processed datasets
+    """
+    if OmegaConf.is_config(process_config):
+        process_config = OmegaConf.to_container(process_config, resolve=True)
+
+    return hashlib.sha1(
+        json.dumps(
+            [
+                DATASET_CACHE_VERSION,
+                data_version,
+                list(columns),
+                label_column,
+                process_config,
+                bool(model_config["one_hot_encode"]),
+                bool(model_config["sparse_one_hot"]),
+                bool(model_config["scale_data"]),
+            ],
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
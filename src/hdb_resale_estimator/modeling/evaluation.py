@@ -333,7 +333,7 @@ class Evaluator:
         scorings = ["neg_mean_squared_error", "neg_mean_absolute_error", "r2"]
         result = cross_validate(
             clone_model,
-            X,
+            self.builder.model_input(X),
             y,
             scoring=scorings,
             cv=self.no_of_cv_folds,
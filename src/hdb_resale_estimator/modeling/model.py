@@ -22,5 +22,5 @@ def make_predictions(
     Returns:
         np.ndarray: Array of predicted target labels
     """
-    predictions = builder.model.predict(data)
+    predictions = builder.model.predict(builder.model_input(data))
     return predictions
@@ -1,5 +1,6 @@
 """Module containing the function to train a model
 """
+import hashlib
 import joblib
 import logging
 import mlflow
@@ -7,18 +8,21 @@ from omegaconf import DictConfig
 import pandas as pd
 
 import hdb_resale_estimator as hdb_est
+from hdb_resale_estimator.modeling.builder import ClassicalModelBuilder
+from hdb_resale_estimator.modeling.dataset_cache import DatasetCache
 
 logger = logging.getLogger(__name__)
 
 
 def train_pipeline(
-    config: DictConfig, feature_label_data: pd.DataFrame
+    config: DictConfig, feature_label_data: pd.DataFrame, data_version: str = None
 ) -> tuple[float, str]:
     """Main function to train a model.
 
     Instantiates a create a ClassicalModelBuilder object and sets model parameters specified in the Hydra config file
 
-    Feature data is prepared by via several steps (encoding, splitting, scaling)
+    Feature data is prepared by via several steps (encoding, splitting, scaling), or loaded from
+    the dataset cache if it was already prepared with the same config
 
     Model is trained on training data and then evaluated on its performance
     on the test (and val) datasets
@@ -31,10 +35,216 @@ def train_pipeline(
     Args:
         config (DictConfig): Configuration parameters for train pipeline
         feature_data (pd.DataFrame): Dataframe containing the derived features
+        data_version (str, optional): version of the derived features used to look up the dataset cache.
+        Defaults to None, which hashes the derived features instead.
 
     Returns:
         tuple[float, str]: Tuple containing the model's performance metric and the model uri
     """
+    chosen_model = config["model_params"]["chosen_model"]
+    logger.info("Building %s model...", chosen_model)
+    builder = hdb_est.modeling.builder.ClassicalModelBuilder().set_model(
+        config["model_params"][chosen_model]["model_name"],
+        config["model_params"][chosen_model]["params"],
+    )
+
+    datasets, processed_features = prepare_datasets(
+        config=config,
+        feature_label_data=feature_label_data,
+        builder=builder,
+        data_version=data_version,
+    )
+
+    return train_model(
+        config=config,
+        builder=builder,
+        datasets=datasets,
+        processed_features=processed_features,
+    )
+
+
+def train_model(
+    config: DictConfig,
+    builder: ClassicalModelBuilder,
+    datasets: dict,
+    processed_features: list,
+) -> tuple[float, str]:
+    """Trains the model of the builder on the processed training data, evaluates its performance
+    on the test (and val) datasets, and logs the evaluation metrics and visualizations, and model
+    artifacts to MLFlow
+
+    Args:
+        config (DictConfig): Configuration parameters for train pipeline
+        builder (ClassicalModelBuilder): builder of the chosen model, with the encoders and scaler
+        fitted on the processed datasets
+        datasets (dict): Dictionary containing the processed datasets
+        processed_features (list): list of processed features
+
+    Returns:
+        tuple[float, str]: Tuple containing the model's performance metric and the model uri
+    """
+    chosen_model = config["model_params"]["chosen_model"]
+
+    # Training model
+    logger.info(f"Training {chosen_model} model...")
+    builder.model.fit(
+        builder.model_input(datasets["train"]["X"]), datasets["train"]["y"]
+    )
+
+    # Evaluate model
+    logger.info("Evaluating %s Model...", chosen_model)
+    evaluator = hdb_est.modeling.evaluation.Evaluator(
+        builder=builder,
+        params=config["evaluator"],
+        chosen_model=chosen_model,
+    )
+    metrics, visualizations_save_dir = evaluator.evaluate_model(datasets=datasets)
+    logger.info("Model performance: %s", metrics)
+
+    # Initialise mlflow for logging
+    logger.info("Initialising MLFlow...")
+    _, description_str, experiment_id = hdb_est.utils.init_mlflow(config["mlflow"])
+
+    with mlflow.start_run(
+        run_name=config["mlflow"]["run_name"], experiment_id=experiment_id, description=description_str
+    ) as run:
+        logger.info("Starting MLFlow Run...")
+        if config["mlflow"]["tags"]:
+            mlflow.set_tags(config["mlflow"]["tags"])
+
+        logger.info("Logging model params...")
+        mlflow.log_params(config["model_params"][chosen_model]["params"])
+
+        # Log model artifacts
+        save_dir = hdb_est.utils.generate_named_tmp_dir(dir_name="model")
+        model_file_name = config["mlflow"]["model_name"]
+        joblib.dump(builder, f"{save_dir}/{model_file_name}")
+        mlflow.log_artifact(save_dir)
+
+        model_uri = f"{experiment_id}/{run.info.run_id}/artifacts/model/{model_file_name}"
+        logger.info("Model logged to %s", model_uri)
+
+        logger.info("Logging model performance metrics...")
+        mlflow.log_metrics(metrics)
+
+        logger.info("Logging model visualizations...")
+        mlflow.log_artifact(visualizations_save_dir)
+        logger.info(
+            f"Model performance visualisation available at {experiment_id}/{run.info.run_id}/artifacts/graph",
+        )
+        features_dict = {}
+        features_dict["features"] = processed_features
+
+        mlflow.log_dict(features_dict, "features.json")
+
+        mlflow.end_run()
+
+    logger.info("Model training has completed!!!")
+
+    return metrics[config["optimisation_metric"]], model_uri
+
+
+def prepare_datasets(
+    config: DictConfig,
+    feature_label_data: pd.DataFrame,
+    builder: ClassicalModelBuilder,
+    data_version: str = None,
+) -> tuple[dict, list]:
+    """Prepares the train, test (and val) datasets of the chosen model, and fits the encoders and
+    scaler of the builder on them.
+
+    When the dataset cache is enabled, the datasets and fitted builder objects are loaded from the
+    cache if they were processed from the same version of the derived features with the same
+    process_train_data config and encoding/scaling flags, and are otherwise saved to it after processing
+
+    Args:
+        config (DictConfig): Configuration parameters for train pipeline
+        feature_label_data (pd.DataFrame): Dataframe containing the derived features
+        builder (ClassicalModelBuilder): builder of the chosen model
+        data_version (str, optional): version of the derived features used to look up the dataset cache.
+        Defaults to None, which hashes the derived features instead.
+
+    Returns:
+        tuple[dict, list]: Dictionary containing the processed datasets and the list of processed features
+    """
+    if not config["dataset_cache"]["enabled"]:
+        return process_datasets(config, feature_label_data, builder)
+
+    dataset_cache = create_dataset_cache(config, feature_label_data, data_version)
+    cached = dataset_cache.load()
+    if cached is not None:
+        logger.info("Loading processed datasets from %s...", dataset_cache.dataset_dir)
+        datasets, objects, processed_features = cached
+        builder.objects.update(objects)
+        return datasets, processed_features
+
+    datasets, processed_features = process_datasets(config, feature_label_data, builder)
+    dataset_cache.save(datasets, dict(builder.objects), processed_features)
+
+    return datasets, processed_features
+
+
+def create_dataset_cache(
+    config: DictConfig, feature_label_data: pd.DataFrame, data_version: str = None
+) -> DatasetCache:
+    """Creates the dataset cache of the datasets processed from the derived features with the
+    process_train_data config and encoding/scaling flags of the chosen model
+
+    Args:
+        config (DictConfig): Configuration parameters for train pipeline
+        feature_label_data (pd.DataFrame): Dataframe containing the derived features
+        data_version (str, optional): version of the derived features. Defaults to None,
+        which hashes the derived features instead.
+
+    Returns:
+        DatasetCache: dataset cache of the processed datasets
+    """
+    if data_version is None:
+        data_version = hashlib.sha1(
+            pd.util.hash_pandas_object(feature_label_data).to_numpy()
+        ).hexdigest()
+
+    chosen_model = config["model_params"]["chosen_model"]
+    return DatasetCache(
+        cache_dir=config["dataset_cache"]["cache_dir"],
+        fingerprint=hdb_est.modeling.dataset_cache.generate_dataset_fingerprint(
+            data_version=data_version,
+            columns=list(feature_label_data.columns),
+            label_column=config["label_column"],
+            process_config=config["process_train_data"],
+            model_config=config["model_params"][chosen_model],
+        ),
+    )
+
+
+def process_datasets(
+    config: DictConfig,
+    feature_label_data: pd.DataFrame,
+    builder: ClassicalModelBuilder,
+) -> tuple[dict, list]:
+    """Processes the derived features into the train, test (and val) datasets of the chosen model
+    via several steps (encoding, splitting, scaling)
+
+    Args:
+        config (DictConfig): Configuration parameters for train pipeline
+        feature_label_data (pd.DataFrame): Dataframe containing the derived features
+        builder (ClassicalModelBuilder): builder of the chosen model
+
+    Raises:
+        ValueError: Sparse one hot encoded features are to be scaled
+
+    Returns:
+        tuple[dict, list]: Dictionary containing the processed datasets and the list of processed features
+    """
+    chosen_model = config["model_params"]["chosen_model"]
+    model_config = config["model_params"][chosen_model]
+    if (
+        model_config["one_hot_encode"]
+        and model_config["sparse_one_hot"]
+        and model_config["scale_data"]
+    ):
+        raise ValueError("Sparse one hot encoded features cannot be scaled")
+
     label_column = config["label_column"]
     if label_column in feature_label_data.columns:
         labels = feature_label_data[label_column]
@@ -44,12 +254,6 @@ def train_pipeline(
     else:
         raise (f"{label_column} not found in dataframe")
 
-    chosen_model = config["model_params"]["chosen_model"]
-    logger.info("Building %s model...", chosen_model)
-    builder = hdb_est.modeling.builder.ClassicalModelBuilder().set_model(
-        config["model_params"][chosen_model]["model_name"],
-        config["model_params"][chosen_model]["params"],
-    )
     builder.objects["features"] = list(features.columns)
 
     logger.info("Processing training derived features...")
@@ -62,7 +266,12 @@ def train_pipeline(
 
     if config["model_params"][chosen_model]["one_hot_encode"]:
         logger.info("Performing one hot encoding on categorical features...")
-        features = builder._one_hot_encode_cat_var(feature_data=features)
+        features = builder._one_hot_encode_cat_var(
+            feature_data=features,
+            sparse_output=config["model_params"][chosen_model]["sparse_one_hot"],
+        )
+
+    processed_features = list(features.columns)
 
     # Split into train, test and validate data
     if config["process_train_data"]["train_test_val_split"]["test_size"]:
@@ -109,58 +318,4 @@ def train_pipeline(
         except:
             pass
 
-    # Training model
-    logger.info(f"Training {chosen_model} model...")
-    builder.model.fit(datasets["train"]["X"], datasets["train"]["y"])
-
-    # Evaluate model
-    logger.info("Evaluating %s Model...", chosen_model)
-    evaluator = hdb_est.modeling.evaluation.Evaluator(
-        builder=builder,
-        params=config["evaluator"],
-        chosen_model=chosen_model,
-    )
-    metrics, visualizations_save_dir = evaluator.evaluate_model(datasets=datasets)
-    logger.info("Model performance: %s", metrics)
-
-    # Initialise mlflow for logging
-    logger.info("Initialising MLFlow...")
-    _, description_str, experiment_id = hdb_est.utils.init_mlflow(config["mlflow"])
-
-    with mlflow.start_run(
-        run_name=config["mlflow"]["run_name"], experiment_id=experiment_id, description=description_str
-    ) as run:
-        logger.info("Starting MLFlow Run...")
-        if config["mlflow"]["tags"]:
-            mlflow.set_tags(config["mlflow"]["tags"])
-
-        logger.info("Logging model params...")
-        mlflow.log_params(config["model_params"][chosen_model]["params"])
-
-        # Log model artifacts
-        save_dir = hdb_est.utils.generate_named_tmp_dir(dir_name="model")
-        model_file_name = config["mlflow"]["model_name"]
-        joblib.dump(builder, f"{save_dir}/{model_file_name}")
-        mlflow.log_artifact(save_dir)
-
-        model_uri = f"{experiment_id}/{run.info.run_id}/artifacts/model/{model_file_name}"
-        logger.info("Model logged to %s", model_uri)
-
-        logger.info("Logging model performance metrics...")
-        mlflow.log_metrics(metrics)
-
-        logger.info("Logging model visualizations...")
-        mlflow.log_artifact(visualizations_save_dir)
-        logger.info(
-            f"Model performance visualisation available at {experiment_id}/{run.info.run_id}/artifacts/graph",
-        )
-        features_dict = {}
-        features_dict["features"] = list(features.columns)
-
-        mlflow.log_dict(features_dict, "features.json")
-
-        mlflow.end_run()
-
-    logger.info("Model training has completed!!!")
-
-    return metrics[config["optimisation_metric"]], model_uri
+    return datasets, processed_features
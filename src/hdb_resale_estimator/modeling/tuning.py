@@ -0,0 +1,285 @@
+"""Module containing the functions to tune the hyperparameters of a model with trials
+trained in parallel worker processes
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from hydra.core.override_parser.overrides_parser import OverridesParser
+from hydra.core.override_parser.types import ChoiceSweep, Override, Transformer
+import logging
+import multiprocessing
+from omegaconf import DictConfig, OmegaConf
+import optuna
+import os
+import pandas as pd
+import yaml
+
+import hdb_resale_estimator as hdb_est
+from hdb_resale_estimator.modeling.builder import ClassicalModelBuilder
+from hdb_resale_estimator.modeling.dataset_cache import DatasetCache
+
+logger = logging.getLogger(__name__)
+
+# Config keys that change the processed datasets, which are shared by every trial
+DATASET_CONFIG_KEYS = ("label_column", "process_train_data", "model_params.chosen_model")
+DATASET_MODEL_FLAGS = ("one_hot_encode", "sparse_one_hot", "scale_data")
+
+_worker_datasets = {}
+
+
+def tune_pipeline(
+    config: DictConfig, feature_label_data: pd.DataFrame, data_version: str = None
+) -> optuna.Study:
+    """Main function to tune the hyperparameters of the chosen model.
+
+    The derived features are processed once into the dataset cache, which every worker process
+    loads at startup. The numeric features and labels are loaded as read-only memory maps shared by
+    the workers, so only the sparse one-hot encoded features and the copy each model makes to train
+    on (eg the DMatrix of xgboost) use memory per worker. The Optuna study is kept by this process, which asks for the params of a
+    trial whenever a worker is idle and tells the study the performance of each finished trial,
+    so that the study is only accessed by this process and kept in its memory.
+
+    The cores are shared between the workers, with each model using cores // workers threads
+
+    Args:
+        config (DictConfig): Configuration parameters for train pipeline, with the tuning config
+        feature_label_data (pd.DataFrame): Dataframe containing the derived features
+        data_version (str, optional): version of the derived features used to look up the dataset cache.
+        Defaults to None, which hashes the derived features instead.
+
+    Raises:
+        ValueError: Storage of the study was given
+        FileNotFoundError: Processed datasets could not be saved to the dataset cache
+
+    Returns:
+        optuna.Study: study containing the tuning trials
+    """
+    tuning_config = config["tuning"]
+    # The RDB storage of the pinned optuna 2.10.1 fails with the pinned SQLAlchemy 2
+    if tuning_config["storage"] is not None:
+        raise ValueError(
+            f"tuning.storage '{tuning_config['storage']}' is not supported, as the Optuna RDB "
+            f"storage of optuna {optuna.__version__} is incompatible with SQLAlchemy 2. "
+            "Set tuning.storage to null to keep the study in memory"
+        )
+    search_space, fixed_params = create_search_space(tuning_config["params"])
+    n_workers, n_jobs = allocate_cpus(
+        n_trials=tuning_config["n_trials"], n_workers=tuning_config["n_workers"]
+    )
+    logger.info(
+        "Tuning with %s workers, each training a model with %s jobs...", n_workers, n_jobs
+    )
+
+    config = OmegaConf.create(OmegaConf.to_container(config, resolve=True))
+    chosen_model = config["model_params"]["chosen_model"]
+    OmegaConf.update(config, f"model_params.{chosen_model}.params.n_jobs", n_jobs)
+    for name, value in fixed_params.items():
+        OmegaConf.update(config, name, value)
+
+    logger.info("Processing training derived features...")
+    dataset_cache = hdb_est.modeling.training.create_dataset_cache(
+        config, feature_label_data, data_version
+    )
+    if not dataset_cache.exists():
+        builder = ClassicalModelBuilder()
+        datasets, processed_features = hdb_est.modeling.training.process_datasets(
+            config, feature_label_data, builder
+        )
+        dataset_cache.save(datasets, dict(builder.objects), processed_features)
+        del datasets
+        if not dataset_cache.exists():
+            raise FileNotFoundError(
+                f"Processed datasets could not be saved to {dataset_cache.dataset_dir}"
+            )
+
+    # The MLFlow experiment is created before the workers log their runs to it
+    hdb_est.utils.init_mlflow(config["mlflow"])
+
+    study = optuna.create_study(
+        study_name=tuning_config["study_name"],
+        direction=tuning_config["direction"],
+        sampler=optuna.samplers.TPESampler(seed=tuning_config["seed"]),
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_tuning_worker,
+        initargs=(dataset_cache.cache_dir, dataset_cache.fingerprint),
+    ) as executor:
+        running_trials = {}
+        n_asked = 0
+        while n_asked < tuning_config["n_trials"] or running_trials:
+            while n_asked < tuning_config["n_trials"] and len(running_trials) < n_workers:
+                trial = study.ask(search_space)
+                trial_config = OmegaConf.create(OmegaConf.to_container(config))
+                for name, value in trial.params.items():
+                    OmegaConf.update(trial_config, name, value)
+                trial_config["mlflow"]["run_name"] = (
+                    f"{config['mlflow']['run_name']} trial {trial.number}"
+                )
+                logger.info("Starting trial %s with %s", trial.number, trial.params)
+                future = executor.submit(
+                    run_tuning_trial, OmegaConf.to_container(trial_config)
+                )
+                running_trials[future] = trial
+                n_asked += 1
+
+            finished, _ = wait(running_trials, return_when=FIRST_COMPLETED)
+            for future in finished:
+                trial = running_trials.pop(future)
+                try:
+                    metric = future.result()
+                except Exception as trial_error:
+                    logger.exception("Trial %s failed: %s", trial.number, trial_error)
+                    study.tell(trial, state=optuna.trial.TrialState.FAIL)
+                else:
+                    study.tell(trial, metric)
+                    logger.info(
+                        "Trial %s finished with %s of %s",
+                        trial.number,
+                        config["optimisation_metric"],
+                        metric,
+                    )
+
+    return study
+
+
+def create_search_space(params: dict) -> tuple[dict, dict]:
+    """Creates the Optuna distributions of the tuned params from the same override syntax as
+    the params of the Hydra Optuna sweeper (eg range(5,15,1), choice(a,b), interval(0.1,1.0))
+
+    Args:
+        params (dict): override of each tuned param
+
+    Raises:
+        ValueError: Tuned param changes the processed datasets, or its sweep is not supported
+
+    Returns:
+        tuple[dict, dict]: Dictionary containing the distribution of each tuned param,
+        and dictionary containing the value of each fixed param
+    """
+    if not params:
+        return {}, {}
+
+    search_space, fixed_params = {}, {}
+    for override in OverridesParser.create().parse_overrides(
+        [f"{name}={value}" for name, value in params.items()]
+    ):
+        if override.is_sweep_override():
+            search_space[override.get_key_element()] = create_distribution(override)
+        else:
+            fixed_params[override.get_key_element()] = override.get_value_element_as_str()
+
+    for name in list(search_space) + list(fixed_params):
+        if name.startswith(DATASET_CONFIG_KEYS) or name.split(".")[-1] in DATASET_MODEL_FLAGS:
+            raise ValueError(
+                f"Tuned param '{name}' changes the processed datasets shared by the trials"
+            )
+
+    return search_space, {
+        name: yaml.safe_load(value) for name, value in fixed_params.items()
+    }
+
+
+def create_distribution(override: Override) -> optuna.distributions.BaseDistribution:
+    """Creates the Optuna distribution of a sweep override, the same way as the Hydra Optuna
+    sweeper. Ranges include their stop value, unless shuffled into a choice
+
+    Args:
+        override (Override): parsed sweep override of a tuned param
+
+    Raises:
+        ValueError: Sweep override is not supported
+
+    Returns:
+        optuna.distributions.BaseDistribution: distribution of the tuned param
+    """
+    value = override.value()
+    if isinstance(value, ChoiceSweep) or (override.is_range_sweep() and value.shuffle):
+        return optuna.distributions.CategoricalDistribution(
+            list(override.sweep_iterator(transformer=Transformer.encode))
+        )
+
+    if override.is_range_sweep():
+        if any(isinstance(bound, float) for bound in (value.start, value.stop, value.step)):
+            return optuna.distributions.DiscreteUniformDistribution(
+                value.start, value.stop, value.step
+            )
+        return optuna.distributions.IntUniformDistribution(
+            int(value.start), int(value.stop), step=int(value.step)
+        )
+
+    if override.is_interval_sweep():
+        integers = isinstance(value.start, int) and isinstance(value.end, int)
+        if "log" in value.tags:
+            if integers:
+                return optuna.distributions.IntLogUniformDistribution(value.start, value.end)
+            return optuna.distributions.LogUniformDistribution(value.start, value.end)
+        if integers:
+            return optuna.distributions.IntUniformDistribution(value.start, value.end)
+        return optuna.distributions.UniformDistribution(value.start, value.end)
+
+    raise ValueError(f"Sweep override '{override.input_line}' is not supported")
+
+
+def allocate_cpus(n_trials: int, n_workers: int = None) -> tuple[int, int]:
+    """Shares the cores available to this process between the workers, so that
+    the number of workers multiplied by the jobs of each model does not exceed the cores
+
+    Args:
+        n_trials (int): number of trials
+        n_workers (int, optional): number of workers. Defaults to None, which uses
+        a worker per core.
+
+    Returns:
+        tuple[int, int]: number of workers and the number of jobs of each model
+    """
+    cores = (
+        len(os.sched_getaffinity(0))
+        if hasattr(os, "sched_getaffinity")
+        else os.cpu_count()
+    )
+    n_workers = max(1, min(n_workers or cores, cores, n_trials))
+
+    return n_workers, max(1, cores // n_workers)
+
+
+def init_tuning_worker(cache_dir: str, fingerprint: str) -> None:
+    """Loads the processed datasets of the dataset cache once per worker process. The numeric
+    features and labels are memory mapped, so the workers share them instead of holding a copy each
+
+    Args:
+        cache_dir (str): directory of the dataset cache
+        fingerprint (str): fingerprint of the processed datasets
+    """
+    hdb_est.utils.setup_logging()
+    datasets, objects, processed_features = DatasetCache(cache_dir, fingerprint).load()
+    _worker_datasets.update(
+        datasets=datasets, objects=objects, processed_features=processed_features
+    )
+
+
+def run_tuning_trial(config: dict) -> float:
+    """Trains and evaluates the model of a trial on the processed datasets of the worker process
+
+    Args:
+        config (dict): Configuration parameters for train pipeline, with the params of the trial
+
+    Returns:
+        float: the model's performance metric
+    """
+    config = OmegaConf.create(config)
+    chosen_model = config["model_params"]["chosen_model"]
+    builder = ClassicalModelBuilder().set_model(
+        config["model_params"][chosen_model]["model_name"],
+        config["model_params"][chosen_model]["params"],
+    )
+    builder.objects.update(_worker_datasets["objects"])
+
+    metric, _ = hdb_est.modeling.training.train_model(
+        config=config,
+        builder=builder,
+        datasets=_worker_datasets["datasets"],
+        processed_features=_worker_datasets["processed_features"],
+    )
+
+    return metric
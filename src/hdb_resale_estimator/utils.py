@@ -1,10 +1,14 @@
 """Utils.py contains the general functions that will be used in during the end-to-end
  pipeline of hdb estimator
 """
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import csv
 from geopy.distance import geodesic
 import glob
 import hashlib
+import io
 import joblib
 import json
 import logging
@@ -14,13 +18,19 @@ import numpy as np
 import os
 import pandas as pd
 from pathlib import Path
+import pyarrow as pa
+from pyarrow import compute as pc
+from pyarrow import csv as pa_csv
+from pyarrow import feather
 import requests
 import sqlalchemy
 import tempfile
+import threading
 import time
-from typing import Tuple
+from typing import Iterator, Tuple
 import yaml
 
+import hdb_resale_estimator as hdb_est
 from hdb_resale_estimator.modeling.builder import ClassicalModelBuilder
 
 logger = logging.getLogger(__name__)
@@ -123,62 +133,319 @@ def read_data(source: str, params: dict) -> pd.DataFrame:
     return dataframe
 
 
-def read_csv(data_path: str, concat: bool = True) -> pd.DataFrame:
+def read_csv(
+    data_path: str,
+    concat: bool = True,
+    dtypes: dict = None,
+    cache_dir: str = None,
+    n_jobs: int = -1,
+) -> pd.DataFrame:
     """Helper function to read csv data from a specified
     file path
 
+    When concatenating all data files, the files are parsed concurrently with the pyarrow csv
+    engine and assembled into one Arrow table, which is converted into a dataframe without an
+    intermediate copy of each file.
+
     Args:
         data_path (str): file directory to read data files from
         concat (bool, optional): boolean to indicate whether to concat all data files.
         Defaults to True.
+        dtypes (dict, optional): data type of each column (eg category, float64). Defaults to None,
+        which infers the data types.
+        cache_dir (str, optional): directory of the columnar cache of the csv files. Defaults to None,
+        which reads the csv files without caching.
+        n_jobs (int, optional): number of files parsed concurrently, -1 to use all cores.
+        Defaults to -1.
 
     Returns:
         pd.DataFrame: resulting dataframe read from file directory
     """
+    dtypes = dict(dtypes) if dtypes else None
 
     if concat:
         all_files = glob.glob(os.path.join(data_path, "*.csv"))
-        li = []
-        for filename in all_files:
-            df = pd.read_csv(filename, index_col=None, header=0)
-            li.append(df)
+        if n_jobs < 0:
+            n_jobs = max(1, os.cpu_count() + 1 + n_jobs)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(n_jobs, len(all_files)))) as executor:
+            li = list(
+                executor.map(
+                    lambda filename: read_csv_table(
+                        filename, dtypes=dtypes, cache_dir=cache_dir, engine="pyarrow"
+                    ),
+                    all_files,
+                )
+            )
 
-        dataframe = pd.concat(li, axis=0, ignore_index=True)
+        # Categories of each file are unified when the dictionary columns are converted
+        dataframe = pa.concat_tables(li).to_pandas(split_blocks=True, self_destruct=True)
+
+    elif cache_dir is None:
+        dataframe = pd.read_csv(data_path, index_col=None, header=0, dtype=dtypes)
 
     else:
-        dataframe = pd.read_csv(data_path, index_col=None, header=0)
+        dataframe = read_csv_table(
+            data_path, dtypes=dtypes, cache_dir=cache_dir, engine="pandas"
+        ).to_pandas(split_blocks=True, self_destruct=True)
 
     return dataframe
 
 
-def find_coordinates(add: str) -> tuple:
+def read_data_chunks(source: str, params: dict, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Helper function to read data in chunks, so that only one chunk is held in memory
+
+    Args:
+        source (str): data source to read from
+        params (dict): configuration parameters used to read data
+        chunksize (int): number of rows per chunk
+
+    Raises:
+        NameError: Data source given does not support reading in chunks
+
+    Returns:
+        Iterator[pd.DataFrame]: chunks of the data
+    """
+
+    if source == "csv":
+        return read_csv_chunks(
+            data_path=params["data_path"],
+            concat=params.get("concat", True),
+            dtypes=params.get("dtypes"),
+            chunksize=chunksize,
+        )
+
+    if source == "postgres":
+        return extract_data_chunks_from_psql(
+            table_name=params["table_name"],
+            columns=params["columns"],
+            dtypes=params.get("dtypes"),
+            chunksize=chunksize,
+        )
+
+    raise NameError(f"Reading in chunks is not supported for source '{source}'")
+
+
+def read_csv_chunks(
+    data_path: str, concat: bool = True, dtypes: dict = None, chunksize: int = 100000
+) -> Iterator[pd.DataFrame]:
+    """Helper function to read csv data from a specified file path in chunks
+
+    Args:
+        data_path (str): file directory to read data files from
+        concat (bool, optional): boolean to indicate whether to read all data files.
+        Defaults to True.
+        dtypes (dict, optional): data type of each column (eg category, float64). Defaults to None.
+        chunksize (int, optional): number of rows per chunk. Defaults to 100000.
+
+    Yields:
+        Iterator[pd.DataFrame]: chunks of the csv data
+    """
+    dtypes = dict(dtypes) if dtypes else None
+    all_files = glob.glob(os.path.join(data_path, "*.csv")) if concat else [data_path]
+
+    for filename in all_files:
+        with pd.read_csv(
+            filename, index_col=None, header=0, dtype=dtypes, chunksize=chunksize
+        ) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def arrow_column_types(dtypes: dict) -> dict:
+    """Converts the data type of each column into the Arrow types of the pyarrow csv engine
+
+    Args:
+        dtypes (dict): data type of each column (eg str, category, float64)
+
+    Returns:
+        dict: Arrow type of each column
+    """
+    arrow_types = {
+        "str": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+
+    return {
+        column: arrow_types.get(dtype) or pa.from_numpy_dtype(np.dtype(dtype))
+        for column, dtype in (dtypes or {}).items()
+    }
+
+
+def parse_csv_table(filename: str, dtypes: dict = None, engine: str = "pyarrow") -> pa.Table:
+    """Helper function to parse a csv file into an Arrow table
+
+    Args:
+        filename (str): file path of the csv file
+        dtypes (dict, optional): data type of each column. Defaults to None.
+        engine (str, optional): csv parser to use (pyarrow or pandas). Defaults to "pyarrow".
+
+    Returns:
+        pa.Table: resulting table parsed from the csv file
+    """
+    if engine == "pyarrow":
+        return pa_csv.read_csv(
+            filename,
+            convert_options=pa_csv.ConvertOptions(
+                column_types=arrow_column_types(dtypes), strings_can_be_null=True
+            ),
+        )
+
+    return pa.Table.from_pandas(
+        pd.read_csv(filename, index_col=None, header=0, dtype=dtypes),
+        preserve_index=False,
+    )
+
+
+def read_csv_table(
+    filename: str, dtypes: dict = None, cache_dir: str = None, engine: str = "pyarrow"
+) -> pa.Table:
+    """Helper function to read a csv file through a columnar cache. The first read writes an
+    uncompressed Feather (Arrow) copy of the parsed csv file, which later reads memory-map
+    as long as the csv file is unchanged. The csv file is considered unchanged if its modification
+    time and size are unchanged, or otherwise if its content hash is unchanged
+
+    Args:
+        filename (str): file path of the csv file
+        dtypes (dict, optional): data type of each column. Defaults to None.
+        cache_dir (str, optional): directory of the columnar cache. Defaults to None,
+        which reads the csv file without caching.
+        engine (str, optional): csv parser to use (pyarrow or pandas). Defaults to "pyarrow".
+
+    Returns:
+        pa.Table: resulting table read from the csv file
+    """
+    if cache_dir is None:
+        return parse_csv_table(filename, dtypes=dtypes, engine=engine)
+
+    cache_key = hashlib.sha1(
+        json.dumps([os.path.abspath(filename), dtypes, engine], sort_keys=True).encode(
+            "utf-8"
+        )
+    ).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir, f"{Path(filename).stem}_{cache_key}.feather")
+    metadata_path = os.path.join(cache_dir, f"{Path(filename).stem}_{cache_key}.json")
+    file_stat = os.stat(filename)
+
+    metadata = None
+    if os.path.exists(cache_path) and os.path.exists(metadata_path):
+        with open(metadata_path, "r") as file:
+            metadata = json.load(file)
+
+    file_hash = None
+    if metadata is not None:
+        if (
+            metadata["mtime_ns"] == file_stat.st_mtime_ns
+            and metadata["size"] == file_stat.st_size
+        ):
+            return feather.read_table(cache_path, memory_map=True)
+
+        file_hash = generate_file_hash(filename)
+        if metadata["file_hash"] == file_hash:
+            table = feather.read_table(cache_path, memory_map=True)
+            metadata.update(mtime_ns=file_stat.st_mtime_ns, size=file_stat.st_size)
+            with open(metadata_path, "w") as file:
+                json.dump(metadata, file)
+            return table
+
+    logger.info(f"Caching {filename} in {cache_dir}...")
+    file_hash = file_hash or generate_file_hash(filename)
+    table = parse_csv_table(filename, dtypes=dtypes, engine=engine)
+
+    # Write to a temporary file first so that concurrent readers never see a partial cache
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, suffix=".feather", delete=False
+    ) as file:
+        temp_cache_path = file.name
+    feather.write_feather(table, temp_cache_path, compression="uncompressed")
+    os.replace(temp_cache_path, cache_path)
+    with open(metadata_path, "w") as file:
+        json.dump(
+            {
+                "mtime_ns": file_stat.st_mtime_ns,
+                "size": file_stat.st_size,
+                "file_hash": file_hash,
+            },
+            file,
+        )
+
+    return table
+
+
+def generate_file_hash(filename: str) -> str:
+    """Generates the content hash of a file
+
+    Args:
+        filename (str): file path
+
+    Returns:
+        str: content hash
+    """
+    file_hash = hashlib.sha1()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def find_coordinates(
+    add: str,
+    geocode_cache=None,
+    use_cache: bool = True,
+    timeout: float = None,
+    onemap_client=None,
+) -> tuple:
     """With the block number and street name, get the full address of the hdb flat,
     including the postal code, geogaphical coordinates (lat/long)
 
+    The coordinates are looked up in the geocode cache first, and only retrieved from OneMap
+    if the address is not cached or has expired. If OneMap is slow or unreachable, the expired
+    coordinates are returned if the address was cached before.
+
     Args:
         add (str): block number and street name
+        geocode_cache (GeocodeCache, optional): geocode cache to use. Defaults to None, which uses
+                                                the process-wide cache at the default path.
+        use_cache (bool, optional): whether to use the geocode cache. Defaults to True.
+        timeout (float, optional): timeout of the OneMap request in seconds. Defaults to None,
+                                   which uses the timeout of the OneMap client.
+        onemap_client (OneMapClient, optional): OneMap client to use. Defaults to None, which uses
+                                                the process-wide inference client of the OneMap
+                                                search API, without retries.
 
     Returns:
         tuple: latitude and longitude coordinates
     """
-    # Do not need to change the URL
-    url = f"https://www.onemap.gov.sg/api/common/elastic/search?searchVal={add}&returnGeom=Y&getAddrDetails=Y&pageNum=1"
+    if use_cache:
+        if geocode_cache is None:
+            geocode_cache = hdb_est.geocoding.get_geocode_cache()
+        coordinates = geocode_cache.get(add)
+        if coordinates is not None:
+            return coordinates
+
+    if onemap_client is None:
+        onemap_client = hdb_est.geocoding.get_inference_onemap_client()
 
-    # Retrieve information from website
-    response = requests.get(url)
     try:
-        data = json.loads(response.text)
-    except ValueError:
-        print("JSONDecodeError")
-        pass
+        result = onemap_client.search(add, timeout=timeout)
+    except (requests.RequestException, ValueError) as error:
+        logger.warning(f"Unable to retrieve coordinates of {add} from OneMap: {error}")
+        coordinates = (
+            geocode_cache.get(add, allow_expired=True) if use_cache else None
+        )
+        return coordinates or (float("inf"), float("inf"))
 
-    if len(data["results"]) != 0:
-        result = data["results"][0]
+    if result is not None:
         latitude, longitude = float(result["LATITUDE"]), float(result["LONGITUDE"])
 
     else:
         latitude, longitude = float("inf"), float("inf")
 
+    if use_cache:
+        geocode_cache.set(add, latitude, longitude)
+
     return latitude, longitude
 
 
@@ -210,6 +477,113 @@ def calculate_haversine_distance(lat1: float,
 
     return earth_radius * 2 * np.arcsin(np.sqrt(a))
 
+
+def blocked_haversine_nearest(
+    flat_coordinates: np.ndarray,
+    amenity_coordinates: np.ndarray,
+    radii: list,
+    k_nearest: int = 1,
+    chunk_size: int = 4096,
+    dtype: str = "float32",
+    earth_radius: int = 6371,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Helper function to find the number of amenities within each radius of every flat,
+    and the distances to the k nearest amenities.
+
+    The haversine distances are computed for one chunk of flats at a time into
+    preallocated (chunk_size, amenities) buffers, which are reduced before moving on
+    to the next chunk. Peak memory therefore depends on the chunk size and not the number of flats
+
+    Args:
+        flat_coordinates (np.ndarray): latitude and longitude of the flats, in degrees
+        amenity_coordinates (np.ndarray): latitude and longitude of the amenities, in degrees
+        radii (list): radii around the flat
+        k_nearest (int, optional): number of nearest amenities to find. Defaults to 1.
+        chunk_size (int, optional): number of flats per chunk. Defaults to 4096.
+        dtype (str, optional): float precision of the distance computation. Defaults to "float32".
+        earth_radius (int, optional): Radius of the earth. Defaults to 6371.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: number of amenities within each radius of shape
+        (flats, radii), distances to the k nearest amenities of shape (flats, k_nearest) and
+        positions of the k nearest amenities of shape (flats, k_nearest). Distances and positions
+        are padded with nan and -1 when there are fewer than k_nearest amenities
+    """
+    no_of_flats = len(flat_coordinates)
+    no_of_amenities = len(amenity_coordinates)
+    k = min(k_nearest, no_of_amenities)
+
+    counts = np.zeros((no_of_flats, len(radii)), dtype=int)
+    distances = np.full((no_of_flats, k_nearest), np.nan)
+    nearest = np.full((no_of_flats, k_nearest), -1)
+    if no_of_flats == 0 or no_of_amenities == 0:
+        return counts, distances, nearest
+
+    # Coordinates are offset from a reference point in float64 before they are cast, so that
+    # the coordinate differences keep their precision when computed in float32
+    reference_coordinates = amenity_coordinates.mean(axis=0)
+    flat_radians = np.radians(flat_coordinates - reference_coordinates).astype(dtype)
+    amenity_latitudes, amenity_longitudes = (
+        np.radians(amenity_coordinates - reference_coordinates).astype(dtype).T
+    )
+    cos_flat_latitudes = np.cos(np.radians(flat_coordinates[:, 0:1])).astype(dtype)
+    cos_amenity_latitudes = np.cos(np.radians(amenity_coordinates[:, 0])).astype(dtype)
+
+    chunk_size = min(chunk_size, no_of_flats)
+    latitude_buffer = np.empty((chunk_size, no_of_amenities), dtype=dtype)
+    longitude_buffer = np.empty((chunk_size, no_of_amenities), dtype=dtype)
+
+    for start in range(0, no_of_flats, chunk_size):
+        end = min(start + chunk_size, no_of_flats)
+        flat_latitudes = flat_radians[start:end, 0:1]
+        flat_longitudes = flat_radians[start:end, 1:2]
+
+        # sin^2(dlat/2) + cos(lat1) * cos(lat2) * sin^2(dlon/2), computed in place
+        chunk_distances = latitude_buffer[: end - start]
+        np.subtract(flat_latitudes, amenity_latitudes, out=chunk_distances)
+        chunk_distances *= 0.5
+        np.sin(chunk_distances, out=chunk_distances)
+        np.square(chunk_distances, out=chunk_distances)
+
+        longitude_term = longitude_buffer[: end - start]
+        np.subtract(flat_longitudes, amenity_longitudes, out=longitude_term)
+        longitude_term *= 0.5
+        np.sin(longitude_term, out=longitude_term)
+        np.square(longitude_term, out=longitude_term)
+        longitude_term *= cos_amenity_latitudes
+        longitude_term *= cos_flat_latitudes[start:end]
+
+        chunk_distances += longitude_term
+        np.sqrt(chunk_distances, out=chunk_distances)
+        np.arcsin(chunk_distances, out=chunk_distances)
+        chunk_distances *= 2 * earth_radius
+
+        for position, radius in enumerate(radii):
+            counts[start:end, position] = np.count_nonzero(
+                chunk_distances <= radius, axis=1
+            )
+
+        if k == 1:
+            nearest_positions = np.argmin(chunk_distances, axis=1)[:, None]
+        else:
+            nearest_positions = np.argpartition(chunk_distances, k - 1, axis=1)[:, :k]
+            nearest_positions = np.take_along_axis(
+                nearest_positions,
+                np.argsort(
+                    np.take_along_axis(chunk_distances, nearest_positions, axis=1),
+                    axis=1,
+                    kind="stable",
+                ),
+                axis=1,
+            )
+        distances[start:end, :k] = np.take_along_axis(
+            chunk_distances, nearest_positions, axis=1
+        )
+        nearest[start:end, :k] = nearest_positions
+
+    return counts, distances, nearest
+
+
 def find_nearest_amenities(
     flat_transaction: pd.Series,
     amenity_details: pd.DataFrame,
@@ -298,8 +672,32 @@ def check_postgres_env() -> None:
             raise KeyError("Ensure that Postgres env is set before saving to Postgres")
 
 
-def create_postgres_engine() -> sqlalchemy.engine:
-    """Create engine to connect to Postgres database
+POSTGRES_POOL_SETTINGS = ("pool_size", "max_overflow", "pool_pre_ping", "pool_recycle")
+_postgres_engines = {}
+_postgres_engines_lock = threading.Lock()
+
+
+def create_postgres_engine(
+    pool_size: int = None,
+    max_overflow: int = None,
+    pool_pre_ping: bool = None,
+    pool_recycle: int = None,
+) -> sqlalchemy.engine:
+    """Get the engine to connect to Postgres database. Engines are created lazily and shared
+    within the process by connection URL and pool settings, so that their pooled connections
+    are reused across reads
+
+    Settings which are not given are read from the POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW,
+    POSTGRES_POOL_PRE_PING and POSTGRES_POOL_RECYCLE environment variables.
+
+    Args:
+        pool_size (int, optional): number of connections kept in the pool. Defaults to None (5).
+        max_overflow (int, optional): number of connections allowed beyond the pool size.
+        Defaults to None (10).
+        pool_pre_ping (bool, optional): whether to test connections when they are checked out of
+        the pool. Defaults to None (True).
+        pool_recycle (int, optional): number of seconds after which connections are replaced.
+        Defaults to None (3600).
 
     Raises:
         KeyError: Raise error if environment variable cannot be found
@@ -317,29 +715,118 @@ def create_postgres_engine() -> sqlalchemy.engine:
         port=os.getenv("POSTGRES_PORT"),
         database=os.getenv("POSTGRES_DB"),
     )
-    engine = sqlalchemy.create_engine(url_object, pool_size=5, pool_recycle=3600)
+
+    pool_settings = (
+        pool_size if pool_size is not None else int(os.getenv("POSTGRES_POOL_SIZE", 5)),
+        max_overflow
+        if max_overflow is not None
+        else int(os.getenv("POSTGRES_MAX_OVERFLOW", 10)),
+        pool_pre_ping
+        if pool_pre_ping is not None
+        else os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true",
+        pool_recycle
+        if pool_recycle is not None
+        else int(os.getenv("POSTGRES_POOL_RECYCLE", 3600)),
+    )
+    with _postgres_engines_lock:
+        engine = _postgres_engines.get((url_object, pool_settings))
+        if engine is None:
+            engine = sqlalchemy.create_engine(
+                url_object,
+                **dict(zip(POSTGRES_POOL_SETTINGS, pool_settings)),
+            )
+            _postgres_engines[(url_object, pool_settings)] = engine
 
     return engine
 
 
-def extract_data_from_psql(table_name: str, columns: list) -> pd.DataFrame:
+def get_postgres_pool_stats() -> dict:
+    """Get the statistics of the connection pool of each shared Postgres engine
+
+    Returns:
+        dict: connection URL (without password) with the pool settings, and the size, checked in,
+        checked out and overflow connections of its pool
+    """
+    with _postgres_engines_lock:
+        engines = dict(_postgres_engines)
+
+    return {
+        "{} ({})".format(
+            url_object.render_as_string(hide_password=True),
+            ", ".join(
+                f"{name}={value}"
+                for name, value in zip(POSTGRES_POOL_SETTINGS, pool_settings)
+            ),
+        ): {
+            "size": engine.pool.size(),
+            "checked_in": engine.pool.checkedin(),
+            "checked_out": engine.pool.checkedout(),
+            "overflow": engine.pool.overflow(),
+        }
+        for (url_object, pool_settings), engine in engines.items()
+    }
+
+
+def dispose_postgres_engines() -> None:
+    """Dispose the shared Postgres engines, closing their pooled connections"""
+    with _postgres_engines_lock:
+        engines = list(_postgres_engines.values())
+        _postgres_engines.clear()
+
+    for engine in engines:
+        engine.dispose()
+
+
+def _reset_postgres_engines_after_fork() -> None:
+    """Drops the pooled connections inherited by a forked process without closing them,
+    as they are still used by the parent process"""
+    global _postgres_engines_lock
+    _postgres_engines_lock = threading.Lock()
+    for engine in _postgres_engines.values():
+        engine.dispose(close=False)
+
+
+atexit.register(dispose_postgres_engines)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_postgres_engines_after_fork)
+
+
+def extract_data_from_psql(
+    table_name: str, columns: list, chunksize: int = None, dtypes: dict = None
+) -> pd.DataFrame:
     """Helper function to extract data from postgres database
 
+    When a chunksize is given, the rows are streamed through a server-side cursor and each chunk
+    is converted into an Arrow table, which are assembled into one dataframe at the end instead of
+    holding the fetched rows and intermediate copies of the dataframe.
+
     Args:
         table_name (str): name of the postgres table to extract data from
         columns (list): list of columns to extract from the postgres table
+        chunksize (int, optional): number of rows fetched per round trip. Defaults to None,
+        which fetches all rows at once.
+        dtypes (dict, optional): data type of each column (eg str, category, float64), only used
+        when streaming. Defaults to None, which infers the data types.
 
     Returns:
         pd.DataFrame: resulting dataframe extracted from postgres table
     """
 
+    if chunksize:
+        tables = list(
+            extract_psql_tables(table_name, columns, chunksize=chunksize, dtypes=dtypes)
+        )
+        if len(tables) == 0:
+            return pd.DataFrame(columns=columns)
+
+        # Columns of unmapped types which are entirely missing within a chunk are promoted
+        return pa.concat_tables(tables, promote=True).to_pandas(
+            split_blocks=True, self_destruct=True
+        )
+
     check_postgres_env()
     db_engine = create_postgres_engine()
-    columns_query = ", ".join(['"' + column + '"' for column in columns])
-    sql_query = sqlalchemy.text(f"""
-        SELECT {columns_query} FROM {table_name}
-        WHERE date_context = (SELECT MAX(date_context) FROM {table_name})
-    """)
+    sql_query = latest_snapshot_query(table_name, columns)
     # Extract data from postgres table
     with db_engine.begin() as conn:
         extracted_df = pd.read_sql(sql_query, conn)
@@ -350,8 +837,232 @@ def extract_data_from_psql(table_name: str, columns: list) -> pd.DataFrame:
     return extracted_df
 
 
+def extract_data_chunks_from_psql(
+    table_name: str, columns: list, chunksize: int = 50000, dtypes: dict = None
+) -> Iterator[pd.DataFrame]:
+    """Helper function to extract data from postgres database in chunks, streamed through a
+    server-side cursor so that only one chunk is held in memory
+
+    Args:
+        table_name (str): name of the postgres table to extract data from
+        columns (list): list of columns to extract from the postgres table
+        chunksize (int, optional): number of rows per chunk. Defaults to 50000.
+        dtypes (dict, optional): data type of each column (eg str, category, float64).
+        Defaults to None, which infers the data types.
+
+    Yields:
+        Iterator[pd.DataFrame]: chunks of the data extracted from postgres table
+    """
+    for table in extract_psql_tables(
+        table_name, columns, chunksize=chunksize, dtypes=dtypes
+    ):
+        yield table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def extract_psql_tables(
+    table_name: str, columns: list, chunksize: int = 50000, dtypes: dict = None
+) -> Iterator[pa.Table]:
+    """Helper function to stream the latest date_context snapshot of a postgres table through a
+    server-side cursor, converting each chunk of rows into an Arrow table
+
+    Args:
+        table_name (str): name of the postgres table to extract data from
+        columns (list): list of columns to extract from the postgres table
+        chunksize (int, optional): number of rows per chunk. Defaults to 50000.
+        dtypes (dict, optional): data type of each column (eg str, category, float64).
+        Defaults to None, which infers the data types.
+
+    Yields:
+        Iterator[pa.Table]: chunks of the data extracted from postgres table
+    """
+
+    check_postgres_env()
+    db_engine = create_postgres_engine()
+    sql_query = latest_snapshot_query(table_name, columns)
+
+    with db_engine.begin() as conn:
+        # Column types are fixed up front, so that chunks which are entirely missing in
+        # a column are not inferred differently from the others
+        arrow_types = {
+            **psql_column_types(conn, table_name, columns),
+            **arrow_column_types(dtypes),
+        }
+        result = conn.execution_options(yield_per=chunksize).execute(sql_query)
+        for rows in result.partitions(chunksize):
+            yield pa.Table.from_arrays(
+                [
+                    psql_column_to_array(values, arrow_types.get(column))
+                    for column, values in zip(columns, zip(*rows))
+                ],
+                names=columns,
+            )
+
+
+def psql_column_types(
+    conn: sqlalchemy.engine.base.Connection, table_name: str, columns: list
+) -> dict:
+    """Helper function to map the column types of a postgres table into Arrow types
+
+    Args:
+        conn (sqlalchemy.engine.base.Connection): Connection to sqlalchemy
+        table_name (str): name of the postgres table
+        columns (list): list of columns to map
+
+    Returns:
+        dict: Arrow type of each column, excluding columns of other types (eg dates)
+    """
+    arrow_types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+
+    column_types = {}
+    for column in sqlalchemy.inspect(conn).get_columns(table_name):
+        try:
+            python_type = column["type"].python_type
+        except NotImplementedError:
+            continue
+        if column["name"] in columns and python_type in arrow_types:
+            column_types[column["name"]] = arrow_types[python_type]
+
+    return column_types
+
+
+def psql_column_to_array(values: tuple, arrow_type: pa.DataType = None) -> pa.Array:
+    """Converts the values of a column fetched from postgres into an Arrow array, trimming the
+    trailing whitespace of string columns
+
+    Args:
+        values (tuple): values of the column
+        arrow_type (pa.DataType, optional): Arrow type of the column. Defaults to None,
+        which infers the type.
+
+    Returns:
+        pa.Array: array of the column
+    """
+    dictionary = arrow_type is not None and pa.types.is_dictionary(arrow_type)
+    array = pa.array(values, type=arrow_type.value_type if dictionary else arrow_type)
+    if pa.types.is_string(array.type):
+        # Missing values become "None", as with the astype(str) of the non-streaming extraction
+        array = pc.utf8_rtrim_whitespace(array.fill_null("None"))
+    if dictionary:
+        array = array.dictionary_encode()
+
+    return array
+
+
+def latest_snapshot_query(table_name: str, columns: list) -> sqlalchemy.TextClause:
+    """Helper function to generate the query selecting the latest date_context snapshot
+    of a postgres table
+
+    Args:
+        table_name (str): name of the postgres table
+        columns (list): list of columns to select
+
+    Returns:
+        sqlalchemy.TextClause: query of the latest date_context snapshot
+    """
+    columns_query = ", ".join(['"' + column + '"' for column in columns])
+
+    # The latest date_context is looked up in the snapshots table, and its rows
+    # through the index on date_context
+    return sqlalchemy.text(f"""
+        SELECT {columns_query} FROM {table_name}
+        WHERE date_context = (SELECT MAX(date_context) FROM {snapshots_table_name(table_name)})
+    """)
+
+
+def snapshots_table_name(table_name: str) -> str:
+    """Helper function to get the name of the table holding the date_context snapshots
+    of a postgres table
+
+    Args:
+        table_name (str): name of the postgres table
+
+    Returns:
+        str: name of the snapshots table
+    """
+    return f"{table_name}_snapshots"
+
+
+def extract_snapshot_months(table_name: str, year_month_column: str) -> Tuple[str, list]:
+    """Helper function to extract the year_months prepared in the latest date_context
+    snapshot of a postgres table
+
+    Args:
+        table_name (str): name of the postgres table
+        year_month_column (str): name of the year_month column
+
+    Returns:
+        Tuple[str, list]: latest date_context and its year_months, None and an empty list
+        if the table does not exist or is empty
+    """
+
+    check_postgres_env()
+    db_engine = create_postgres_engine()
+    with db_engine.begin() as conn:
+        if not sqlalchemy.inspect(conn).has_table(table_name):
+            return None, []
+
+        sql_query = sqlalchemy.text(f"""
+            SELECT DISTINCT date_context, "{year_month_column}" FROM {table_name}
+            WHERE date_context = (SELECT MAX(date_context) FROM {snapshots_table_name(table_name)})
+        """)
+        rows = conn.execute(sql_query).fetchall()
+
+    if len(rows) == 0:
+        return None, []
+
+    return str(rows[0][0]).rstrip(), [row[1] for row in rows]
+
+
+def generate_data_version(source: str, params: dict) -> str:
+    """Helper function to generate the version of the data read with read_data, which changes
+    whenever the data read would change. The version of csv data is based on the content hash
+    of its csv files, and the version of postgres data on the latest date_context snapshot
+    with its number of rows and last update time
+
+    Args:
+        source (str): data source to read from
+        params (dict): configuration parameters used to read data
+
+    Raises:
+        NameError: Source name given was incorrect
+
+    Returns:
+        str: version of the data
+    """
+    if source == "csv":
+        if params.get("concat", True):
+            all_files = sorted(glob.glob(os.path.join(params["data_path"], "*.csv")))
+        else:
+            all_files = [params["data_path"]]
+        versions = [generate_file_hash(filename) for filename in all_files]
+
+    elif source == "postgres":
+        check_postgres_env()
+        db_engine = create_postgres_engine()
+        with db_engine.begin() as conn:
+            sql_query = sqlalchemy.text(f"""
+                SELECT date_context, number_of_rows, updated_at
+                FROM {snapshots_table_name(params["table_name"])}
+                ORDER BY date_context DESC LIMIT 1
+            """)
+            versions = [str(value) for row in conn.execute(sql_query) for value in row]
+
+    else:
+        raise NameError(f"Incorrect source, '{source}' was given")
+
+    return hashlib.sha1(
+        json.dumps(
+            [source, json.dumps(dict(params), sort_keys=True, default=str), versions]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
 def push_data_to_sql(
-    db_engine: sqlalchemy.engine, data: pd.DataFrame, table_name: str
+    db_engine: sqlalchemy.engine,
+    data: pd.DataFrame,
+    table_name: str,
+    append_to_snapshot: bool = False,
+    method: str = "copy",
 ) -> None:
     """Save data into postgres database
 
@@ -359,10 +1070,48 @@ def push_data_to_sql(
         db_engine (sqlalchemy.engine): Postgres database engine
         data (pd.DataFrame): Data that is to be saved
         table_name (str): Name of postgres table
+        append_to_snapshot (bool, optional): whether the data is appended to an existing
+                                             date_context snapshot. Defaults to False.
+        method (str, optional): insertion method, copy (COPY FROM STDIN) or multi (multi-row INSERT).
+                                Defaults to "copy".
     """
 
     with db_engine.begin() as conn:
-        check_duplicate_date_input(conn, data, table_name)
+        if not append_to_snapshot:
+            check_duplicate_date_input(conn, data, table_name)
+        write_data_to_sql(conn, data, table_name, method=method)
+
+
+def write_data_to_sql(
+    conn: sqlalchemy.engine.base.Connection,
+    data: pd.DataFrame,
+    table_name: str,
+    method: str = "copy",
+) -> None:
+    """Append data into a postgres table within the transaction of a connection
+
+    Args:
+        conn (sqlalchemy.engine.base.Connection): Connection to sqlalchemy
+        data (pd.DataFrame): Data that is to be saved
+        table_name (str): Name of postgres table
+        method (str, optional): insertion method, copy (COPY FROM STDIN) or multi (multi-row INSERT).
+                                Defaults to "copy".
+
+    Raises:
+        NameError: Insertion method given was incorrect
+    """
+
+    if method == "copy":
+        data.to_sql(
+            table_name,
+            conn,
+            if_exists="append",
+            index=False,
+            chunksize=100000,
+            method=copy_insert,
+        )
+
+    elif method == "multi":
         data.to_sql(
             table_name,
             conn,
@@ -372,6 +1121,71 @@ def push_data_to_sql(
             method="multi",
         )
 
+    else:
+        raise NameError(f"Incorrect insertion method, '{method}' was given")
+
+    record_snapshots(conn, data, table_name)
+
+
+def record_snapshots(
+    conn: sqlalchemy.engine.base.Connection, data: pd.DataFrame, table_name: str
+) -> None:
+    """Adds the number of rows of each date_context in the data to the snapshots table,
+    within the transaction of a connection
+
+    Args:
+        conn (sqlalchemy.engine.base.Connection): Connection to sqlalchemy
+        data (pd.DataFrame): Data that was saved
+        table_name (str): Name of postgres table the data was saved to
+    """
+
+    query = sqlalchemy.text(f"""
+        INSERT INTO {snapshots_table_name(table_name)} (date_context, number_of_rows)
+        VALUES (:date_context, :number_of_rows)
+        ON CONFLICT (date_context) DO UPDATE SET
+            number_of_rows = {snapshots_table_name(table_name)}.number_of_rows + EXCLUDED.number_of_rows,
+            updated_at = CURRENT_TIMESTAMP
+    """)
+    snapshots = [
+        {
+            "date_context": str(np.datetime64(date_context, "D")),
+            "number_of_rows": int(number_of_rows),
+        }
+        for date_context, number_of_rows in data["date_context"].value_counts().items()
+    ]
+    if snapshots:
+        conn.execute(query, snapshots)
+
+
+def copy_insert(table, conn, keys: list, data_iter: Iterator) -> None:
+    """Insertion method of DataFrame.to_sql which streams the rows into the table with
+    COPY FROM STDIN in csv format, over the psycopg2 connection of the sqlalchemy connection
+    so that it runs within the same transaction
+
+    Args:
+        table (pandas.io.sql.SQLTable): table to insert into
+        conn (sqlalchemy.engine.base.Connection): Connection to sqlalchemy
+        keys (list): column names
+        data_iter (Iterator): rows of values, with None for missing values
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Missing values are written as \N, so that they are not confused with empty strings
+    writer.writerows(
+        [r"\N" if value is None else value for value in row] for row in data_iter
+    )
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{key}"' for key in keys)
+    table_name = (
+        f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+    )
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
 
 def check_duplicate_date_input(
     conn: sqlalchemy.engine.base.Connection, data: pd.DataFrame, table_name: str
@@ -398,9 +1212,10 @@ def check_duplicate_date_input(
     # Get date_context or date_of_inference in string format from data
     reference_column_value = str(np.datetime64(data[reference_column].unique()[0], "D"))
 
-    query = sqlalchemy.text(f"""SELECT COUNT(*) FROM {table_name} WHERE {reference_column} = '{reference_column_value}'""")
+    # The snapshots table holds one row per date_context, so this is a primary key lookup
+    query = sqlalchemy.text(f"""SELECT COUNT(*) FROM {snapshots_table_name(table_name)} WHERE {reference_column} = :reference_column_value""")
 
-    result = conn.execute(query)
+    result = conn.execute(query, {"reference_column_value": reference_column_value})
     for row in result:
         # row is a tuple for this query
         date_context_rows = row[0]
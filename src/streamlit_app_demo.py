@@ -57,9 +57,15 @@ def validate_input_data(input: dict) -> List[str]:
     if ((input["block"] == "") | (input["street_name"] == "")):
         messages.append("Please input a valid block and/or street name")
     else:
-        if hdb_est.utils.find_coordinates(input["block"] + " " + input["street_name"]) == (
-            float("inf"),
-            float("inf")):
+        # Geocoded the same way as during inference, offline first and OneMap only as fallback
+        feature_engineer = hdb_est.data_prep.feature_engineering.FeatureEngineer(
+            params=config["data_prep"], inference_mode=True
+        )
+        hdb_coordinates = feature_engineer.geocode_flats(
+            pd.DataFrame([input]),
+            config["data_prep"]["feature_engineering"]["generate_amenities_features"],
+        )
+        if hdb_coordinates.iloc[0].tolist() == [float("inf"), float("inf")]:
             messages.append("Please input a valid block and/or street name")
 
     if input["floor_area_sqm"] <= 0:
@@ -274,7 +280,9 @@ def main():
             processed_hdb_flat_df = builder.process_inference_data(
                 inference_data=hdb_flat_df
             )
-            predicted_resale_value = PRED_MODEL.predict(processed_hdb_flat_df)
+            predicted_resale_value = hdb_est.modeling.model.make_predictions(
+                builder=builder, data=processed_hdb_flat_df
+            )
 
             # Display additional amenity information on dashboard
             number_of_amenities_df = derived_input_data_df[
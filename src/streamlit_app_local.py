@@ -19,8 +19,12 @@ import requests
 import shap
 import streamlit as st
 from streamlit_folium import folium_static
+import yaml
 from typing import List
 
+with open("conf/data_prep.yaml", "r") as file:
+    config = yaml.safe_load(file)
+
 logger = logging.getLogger(__name__)
 
 
@@ -44,9 +48,15 @@ def validate_input_data(input: dict) -> List[str]:
     if ((input["block"] == "") | (input["street_name"] == "")):
         messages.append("Please input a valid block and/or street name")
     else:
-        if hdb_est.utils.find_coordinates(input["block"] + " " + input["street_name"]) == (
-            float("inf"),
-            float("inf")):
+        # Geocoded the same way as during inference, offline first and OneMap only as fallback
+        feature_engineer = hdb_est.data_prep.feature_engineering.FeatureEngineer(
+            params=config["data_prep"], inference_mode=True
+        )
+        hdb_coordinates = feature_engineer.geocode_flats(
+            pd.DataFrame([input]),
+            config["data_prep"]["feature_engineering"]["generate_amenities_features"],
+        )
+        if hdb_coordinates.iloc[0].tolist() == [float("inf"), float("inf")]:
             messages.append("Please input a valid block and/or street name")
 
     if input["floor_area_sqm"] <= 0:
@@ -29,9 +29,15 @@ def main(train_config):
                 source=read_from_source, params=read_params
             )
 
+            data_version = None
+            if train_config["dataset_cache"]["enabled"]:
+                data_version = hdb_est.utils.generate_data_version(
+                    source=read_from_source, params=read_params
+                )
+
             logger.info("Initialising model training...")
             metric, model_uri = hdb_est.modeling.training.train_pipeline(
-                train_config, derived_hdb_features
+                train_config, derived_hdb_features, data_version=data_version
             )
             logger.info("Model training completed!!!")
 
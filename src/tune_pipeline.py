@@ -0,0 +1,47 @@
+"""
+## tune_pipeline.py reads data containing derived features and tunes the hyperparameters
+of the chosen model, training the trials in parallel worker processes
+"""
+import hydra
+import logging
+
+import hdb_resale_estimator as hdb_est
+
+logger = logging.getLogger(__name__)
+
+
+@hydra.main(config_path="../conf", config_name="train_config.yaml", version_base=None)
+def main(train_config):
+    with hdb_est.utils.timer("Model tuning"):
+        hdb_est.utils.setup_logging()
+        logger.info("Starting tune pipeline...")
+        logger.info("Retrieving training data...")
+
+        read_from_source = train_config["files"]["derived_features"]["read_from_source"]
+        read_params = train_config["files"]["derived_features"][f"{read_from_source}_params"]
+
+        derived_hdb_features = hdb_est.utils.read_data(
+            source=read_from_source, params=read_params
+        )
+        data_version = hdb_est.utils.generate_data_version(
+            source=read_from_source, params=read_params
+        )
+
+        logger.info("Initialising model tuning...")
+        study = hdb_est.modeling.tuning.tune_pipeline(
+            train_config, derived_hdb_features, data_version=data_version
+        )
+        logger.info(
+            "Best trial %s: %s of %s with params %s",
+            study.best_trial.number,
+            train_config["optimisation_metric"],
+            study.best_value,
+            study.best_params,
+        )
+        logger.info("Model tuning completed!!!")
+
+    return study.best_value
+
+
+if __name__ == "__main__":
+    main()